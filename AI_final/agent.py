@@ -1,22 +1,299 @@
+import atexit
+import math
 import random
-import pickle
 import os
 import copy
-from collections import defaultdict, Counter
-from mahjong_logic import is_hu, can_hu_with_tile, can_peng, can_gang, get_chi_options
+import logging
+import threading
+import time
+import weakref
+from collections import OrderedDict
+import numpy as np
+from mahjong_logic import (
+    NUM_TILE_KINDS, HONOR_START, tile_name, Hand, key_remove,
+    claim_table, shanten, winning_tiles, is_hu
+)
+from model_format import read_model, write_model
+import mahjong_log
+
+EVAL_CACHE_SIZE = 1 << 15  # evaluate_hand 快取的預設筆數
+MODEL_PATH = 'mahjong_agent.bin'
+# 每個角色各自的模型檔（model_format 的格式）
+MODEL_PATHS = {'player': MODEL_PATH, 'ai': 'mahjong_agent_ai.bin'}
+# 自己的模型檔不存在時依序嘗試的舊版 pickle；最早兩個角色共用 mahjong_agent.pkl
+LEGACY_MODEL_PATHS = {
+    'player': ('mahjong_agent.pkl',),
+    'ai': ('mahjong_agent_ai.pkl', 'mahjong_agent.pkl'),
+}
+CHECKPOINT_GAMES = 20      # 累積幾場未存檔就存檔
+CHECKPOINT_SECONDS = 60.0  # 或距上次存檔超過幾秒（在對局結束時檢查）
+
+# evaluate_hand 的特徵，順序即權重向量的順序（與 weights 的鍵相同）
+FEATURE_NAMES = (
+    'pair', 'triple', 'sequence', 'almost_ready', 'ready_high_score',
+    'terminal', 'middle', 'near_middle',
+    'honor', 'honor_pair', 'honor_triple',
+    'one_away', 'two_away', 'flexible',
+    'safe_tile', 'risky_tile',
+    'single', 'isolated',
+)
+_F = {name: i for i, name in enumerate(FEATURE_NAMES)}
+
+_log = mahjong_log.get_logger("agent")
+_decision_log = mahjong_log.get_logger("decision")
+
+# 新模型的初始權重
+DEFAULT_WEIGHTS = {
+    # 基本牌型權重
+    'pair': 2.0,          # 對子價值
+    'triple': 3.0,        # 刻子價值
+    'sequence': 2.5,      # 順子價值
+    'almost_ready': 6.0,  # 聽牌價值
+    'ready_high_score': 8.0,  # 高分聽牌價值（可能胡大牌）
+    
+    # 位置和數字權重
+    'terminal': -1.0,     # 邊張價值（1和9）
+    'middle': 1.5,        # 中張價值（456）
+    'near_middle': 1.0,   # 近中張價值（34567）
+    
+    # 特殊牌權重
+    'honor': 2.0,         # 字牌價值
+    'honor_pair': 3.0,    # 字牌對子價值
+    'honor_triple': 4.0,  # 字牌刻子價值
+    
+    # 進展程度權重
+    'one_away': 3.0,      # 差一張完成面子
+    'two_away': 1.5,      # 差兩張完成面子
+    'flexible': 2.0,      # 牌型靈活度（可以形成多種組合）
+    
+    # 防禦權重
+    'safe_tile': 2.0,     # 安全牌價值
+    'risky_tile': -2.0,   # 危險牌價值
+    
+    # 其他權重
+    'single': -1.5,       # 單張價值
+    'isolated': -2.0,     # 孤立牌價值（無法形成順子）
+}
+
+def is_waiting(hand):
+    """檢查是否聽牌"""
+    # 門清 13 張才可能差一張胡；先用向聽數排除大部分沒聽牌的手牌
+    if len(hand) != 13 or shanten(hand) != 0:
+        return False
+    return bool(winning_tiles(hand, 0))
+
+# 特徵表：每手牌拆成 31 個槽位，每個槽位的代碼對應一列特徵貢獻
+# - 槽位 0-15：每種牌的張數 (0-4)
+# - 槽位 16-22：萬子每個連續三張窗口的有無 (3 bits)
+# - 槽位 23-30：2-9 萬的張數*2 + 小一號的牌有沒有 (判斷靈活/孤立)
+_WINDOW_SLOT = NUM_TILE_KINDS
+_FLEX_SLOT = _WINDOW_SLOT + 7
+_NUM_SLOTS = _FLEX_SLOT + 8
+
+def _build_feature_table():
+    table = np.zeros((_NUM_SLOTS, 10, len(FEATURE_NAMES)))
+    for tile in range(NUM_TILE_KINDS):
+        for n in range(5):
+            row = table[tile, n]
+            row[_F['single']] = n == 1
+            if tile >= HONOR_START:
+                row[_F['honor_pair']] = n == 2
+                row[_F['honor_triple']] = n == 3
+                row[_F['honor']] = row[_F['safe_tile']] = n
+                continue
+            row[_F['pair']] = n == 2
+            row[_F['triple']] = n == 3
+            row[_F['isolated']] = n   # 先全部算孤立，靈活的在 _FLEX_SLOT 扣回
+            if tile in (0, 8):
+                row[_F['terminal']] = row[_F['safe_tile']] = n
+            elif tile in (3, 4, 5):
+                row[_F['middle']] = row[_F['risky_tile']] = n
+            elif tile in (2, 6):
+                row[_F['near_middle']] = n
+    for i in range(7):
+        for code in range(8):
+            kinds = bin(code).count("1")
+            if kinds:
+                name = ('two_away', 'one_away', 'sequence')[kinds - 1]
+                table[_WINDOW_SLOT + i, code, _F[name]] = 1
+    for j in range(8):
+        for n in range(5):
+            table[_FLEX_SLOT + j, 2 * n + 1, _F['flexible']] = n
+            table[_FLEX_SLOT + j, 2 * n + 1, _F['isolated']] = -n
+    return table
+
+_FEATURE_TABLE = _build_feature_table()
+_SLOTS = np.arange(_NUM_SLOTS)
+
+def _slot_codes(counts):
+    """單手牌（16 格 list）的 31 個槽位代碼；少量資料時純 Python 比 numpy 快。"""
+    present = [n > 0 for n in counts[:HONOR_START]]
+    return (list(counts)
+            + [present[i] + 2 * present[i+1] + 4 * present[i+2] for i in range(7)]
+            + [2 * counts[t] + present[t-1] for t in range(1, HONOR_START)])
+
+def _waiting_features(f, counts):
+    """聽牌與大牌可能（兩對以上字牌對子，或清一色）；只有 13 張時需要檢查。"""
+    if sum(counts) == 13 and is_waiting(Hand.from_counts(counts)):
+        f[_F['almost_ready']] = 1
+        honor = counts[HONOR_START:]
+        if sum(1 for n in honor if n >= 2) >= 2 or not any(honor):
+            f[_F['ready_high_score']] = 1
+
+def hand_features(counts, check_waiting=True):
+    """
+    由 16 格張數算出 evaluate_hand 的特徵（每種牌型/位置出現幾次）。
+    counts 為 (16,) 或 (N, 16)，回傳 (F,) 或 (N, F) 的 float 陣列；
+    手牌價值就是特徵與權重向量的內積。
+    check_waiting=False 時跳過聽牌檢查（呼叫端已知道都沒聽牌）。
+    """
+    if np.ndim(counts) == 1:
+        counts = list(counts)
+        f = _FEATURE_TABLE[_SLOTS, _slot_codes(counts)].sum(axis=0)
+        _waiting_features(f, counts)
+        return f
+
+    c = np.asarray(counts).astype(np.intp)
+    present = c[:, :HONOR_START] > 0
+    codes = np.concatenate([
+        c,
+        present[:, :-2] + 2 * present[:, 1:-1] + 4 * present[:, 2:],
+        2 * c[:, 1:HONOR_START] + present[:, :-1],
+    ], axis=1)
+    f = _FEATURE_TABLE[_SLOTS, codes].sum(axis=1)
+    if not check_waiting:
+        return f
+    for i in np.flatnonzero(c.sum(axis=1) == 13):
+        _waiting_features(f[i], c[i].tolist())
+    return f
+
+
+def _complete_weights(weights):
+    """
+    依 FEATURE_NAMES 整理讀進來的權重：舊模型缺少的特徵用 DEFAULT_WEIGHTS，
+    已不再使用的特徵丟掉。
+    """
+    completed = {}
+    for name in FEATURE_NAMES:
+        value = weights.get(name)
+        completed[name] = DEFAULT_WEIGHTS[name] if value is None or math.isnan(value) else float(value)
+    return completed
+
+def _posterior_above(wins, games, x):
+    """均勻先驗下，games 場勝 wins 場後勝率大於 x 的後驗機率。"""
+    # 後驗為 Beta(wins + 1, games - wins + 1)，其 P(p > x) = P(Binomial(games + 1, x) <= wins)
+    n = games + 1
+    return sum(math.comb(n, k) * x ** k * (1 - x) ** (n - k) for k in range(wins + 1))
+
+
+class ModelWriter:
+    """
+    背景寫模型檔的執行緒。每個路徑只保留最新一份待寫的狀態，
+    寫入跟不上時舊的快照直接被取代。
+    """
+
+    def __init__(self):
+        self._pending = {}  # 路徑 -> 模型狀態
+        self._busy = False
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def submit(self, path, model_state):
+        with self._cond:
+            self._pending[path] = model_state
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="model-writer", daemon=True)
+                self._thread.start()
+            self._cond.notify_all()
+
+    def flush(self, timeout=None):
+        """等到所有待寫的狀態都寫完；逾時回傳 False。"""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._pending and not self._busy, timeout)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending)
+                path, model_state = self._pending.popitem()
+                self._busy = True
+            try:
+                write_model(path, model_state)
+            except Exception as e:
+                _log.error("保存模型時發生錯誤: %s", e)
+            with self._cond:
+                self._busy = False
+                self._cond.notify_all()
+
+_model_writer = ModelWriter()
+_live_agents = weakref.WeakSet()
+
+@atexit.register
+def _flush_agents():
+    """程式結束前把各 agent 還沒存的戰績寫完。"""
+    for agent in list(_live_agents):
+        agent.flush()
+
+
+class Decision:
+    """
+    MahjongAgent.decide 的結果。
+    action：'hu'、'gang'、'peng'、'chi'、'discard' 或 'pass'
+    chi：吃的順子 (list)，只有 action == 'chi' 時有值
+    discard：要打的牌；吃/碰時是接著要打的牌，胡、槓、略過時為 None
+    values：每個選項的價值。對棄牌反應時為 {'pass': 不動, 'gang': …, 'peng': …,
+            ('chi', 順子): …}；輪到自己打牌時為 {牌: 價值}，依價值由高到低
+    """
+    __slots__ = ("action", "chi", "discard", "values")
+
+    def __init__(self, action, chi=None, discard=None, values=None):
+        self.action = action
+        self.chi = chi
+        self.discard = discard
+        self.values = values if values is not None else {}
+
+    def __repr__(self):
+        return f"Decision({self.action!r}, chi={self.chi}, discard={self.discard})"
+
 
 class MahjongAgent:
-    def __init__(self, role="player"):
+    def __init__(self, role="player", eval_cache_size=EVAL_CACHE_SIZE, weights=None, model_path=None):
         """初始化 MahjongAgent
         role: 'player' 或 'ai'，用於區分不同角色的 agent
+        eval_cache_size: evaluate_hand 快取的最大筆數，0 表示不快取
+        weights: 直接使用這組權重，不讀寫模型檔，也不在結束時存檔（離線訓練用）
+        model_path: 模型檔，預設依角色取 MODEL_PATHS（不存在時讀 LEGACY_MODEL_PATHS）
+        通常用 get_agent(role) 取得共用的 agent，不要每局重建
         """
-        print(f"初始化 MahjongAgent (role: {role})")
+        _log.info("初始化 MahjongAgent (role: %s)", role)
         self.role = role
+        self.model_path = model_path or MODEL_PATHS.get(role, MODEL_PATH)
+        self.log_decisions = True  # 模擬用的 agent 可關掉，免得洗掉 decision log
+        self.legacy_paths = () if model_path else LEGACY_MODEL_PATHS.get(role, ())
+
+        # 手牌價值快取：(手牌 key, 權重版本) -> 價值，最久沒用的先淘汰
+        self.eval_cache_size = eval_cache_size
+        self._eval_cache = OrderedDict()
+        self.eval_cache_hits = 0
+        self.eval_cache_misses = 0
+        self.weights_version = 0
         
         # 初始化基本變數
         self.exploration_interval = 100  # 每100場嘗試探索
         self.exploration_rate = 0.90 # 90%的機率進行探索
         self.improvement_threshold = 0.025  # 2.5%的提升閾值
+        # 新權重的序貫評估：勝率後驗分布夠明確就提早結束（見 sequential_test）
+        self.evaluation_alpha = 0.05   # 整個評估誤接受的上限，平均分給每次檢查（見 sequential_test）
+        self.evaluation_beta = 0.10    # 每次檢查時此機率低於 beta 就提早拒絕
+        self.evaluation_min_games = 10  # 至少打這麼多場才判斷
+        self.evaluation_look_interval = 10  # 每隔這麼多場才檢查一次
+        self.evaluation_history = []  # 每次評估用了幾場：{'games', 'win_rate', 'accepted', 'early'}
+
+        # 存檔策略：update_statistics 後累積 checkpoint_games 場或超過 checkpoint_seconds 秒才存
+        self.checkpoint_games = CHECKPOINT_GAMES
+        self.checkpoint_seconds = CHECKPOINT_SECONDS
+        self._unsaved_games = 0
+        self._last_checkpoint = time.monotonic()
         
         # 初始化統計數據
         self.wins = 0
@@ -33,13 +310,17 @@ class MahjongAgent:
         self.current_session_draws = 0
         self.current_session_games = 0
         
+        if weights is not None:
+            self.weights = dict(weights)
+            self.best_weights = copy.deepcopy(self.weights)
+            return
+        _live_agents.add(self)
         # 嘗試載入已保存的模型，如果失敗則初始化新模型
         if not self.load_model():
             self.initialize_model()
         else:
-            # 重置探索計數器
+            # 重置探索計數器（下次存檔時寫入）
             self.games_since_last_exploration = 0
-            self.save_model()
             
     def initialize_model(self):
         """初始化模型參數"""
@@ -53,39 +334,9 @@ class MahjongAgent:
         self.has_baseline = False
         
         # 初始化權重
-        self.weights = {
-            # 基本牌型權重
-            'pair': 2.0,          # 對子價值
-            'triple': 3.0,        # 刻子價值
-            'sequence': 2.5,      # 順子價值
-            'almost_ready': 6.0,  # 聽牌價值
-            'ready_high_score': 8.0,  # 高分聽牌價值（可能胡大牌）
-            
-            # 位置和數字權重
-            'terminal': -1.0,     # 邊張價值（1和9）
-            'middle': 1.5,        # 中張價值（456）
-            'near_middle': 1.0,   # 近中張價值（34567）
-            
-            # 特殊牌權重
-            'honor': 2.0,         # 字牌價值
-            'honor_pair': 3.0,    # 字牌對子價值
-            'honor_triple': 4.0,  # 字牌刻子價值
-            
-            # 進展程度權重
-            'one_away': 3.0,      # 差一張完成面子
-            'two_away': 1.5,      # 差兩張完成面子
-            'flexible': 2.0,      # 牌型靈活度（可以形成多種組合）
-            
-            # 防禦權重
-            'safe_tile': 2.0,     # 安全牌價值
-            'risky_tile': -2.0,   # 危險牌價值
-            
-            # 其他權重
-            'single': -1.5,       # 單張價值
-            'isolated': -2.0,     # 孤立牌價值（無法形成順子）
-        }
+        self.weights = copy.deepcopy(DEFAULT_WEIGHTS)
         self.best_weights = copy.deepcopy(self.weights)
-        print("模型已初始化")
+        _log.info("模型已初始化")
         
     def explore_weights(self):
         """探索新的權重組合"""
@@ -99,235 +350,193 @@ class MahjongAgent:
             new_weights[key] = new_value
         return new_weights
         
+    @property
+    def weights(self):
+        return self._weights
+
+    @weights.setter
+    def weights(self, weights):
+        # 換權重時一併轉成與 FEATURE_NAMES 對齊的向量，並讓舊的快取失效
+        # （只偵測整個指定；要改單一權重請指定一份新的 dict）
+        self._weights = weights
+        self._weight_vector = np.array([weights[name] for name in FEATURE_NAMES])
+        self.weights_version += 1
+        self._eval_cache.clear()
+
+    @property
+    def evaluation_look_interval(self):
+        return self._evaluation_look_interval
+
+    @evaluation_look_interval.setter
+    def evaluation_look_interval(self, interval):
+        # sequential_test 以此取餘數並計算檢查次數，不能是 0 或負數
+        if interval < 1:
+            raise ValueError(f"evaluation_look_interval 至少要是 1，收到 {interval}")
+        self._evaluation_look_interval = interval
+
+    def _cache_get(self, key):
+        cache_key = (key, self.weights_version)
+        value = self._eval_cache.get(cache_key)
+        if value is None:
+            self.eval_cache_misses += 1
+        else:
+            self.eval_cache_hits += 1
+            self._eval_cache.move_to_end(cache_key)
+        return value
+
+    def _cache_put(self, key, value):
+        if self.eval_cache_size <= 0:
+            return
+        self._eval_cache[(key, self.weights_version)] = value
+        if len(self._eval_cache) > self.eval_cache_size:
+            self._eval_cache.popitem(last=False)
+
+    def eval_cache_info(self):
+        """evaluate_hand 快取的 (hits, misses, maxsize, currsize)。"""
+        return (self.eval_cache_hits, self.eval_cache_misses,
+                self.eval_cache_size, len(self._eval_cache))
+
     def evaluate_hand(self, hand):
-        """評估手牌價值"""
+        """評估手牌價值（hand 為 Hand）；結果依手牌 key 與權重版本快取"""
         if not hand:
             return -10.0
-            
-        value = 0.0
-        counts = Counter(hand)
-        
-        # 計算基本牌型價值
-        value += self._evaluate_basic_patterns(hand, counts)
-        
-        # 計算位置和數字價值
-        value += self._evaluate_positions(hand)
-        
-        # 計算進展程度
-        value += self._evaluate_progress(hand)
-        
-        # 計算防禦價值
-        value += self._evaluate_defense(hand)
-        
-        # 檢查聽牌和高分可能
-        if self.is_waiting(hand):
-            value += self.weights['almost_ready']
-            if self._has_potential_high_score(hand):
-                value += self.weights['ready_high_score']
-                
-        return value
-        
-    def _evaluate_basic_patterns(self, hand, counts):
-        """評估基本牌型"""
-        value = 0.0
-        
-        # 計算對子和刻子
-        for tile, count in counts.items():
-            if count == 2:
-                if tile in ["東", "南", "西", "北", "中", "發", "白"]:
-                    value += self.weights['honor_pair']
-                else:
-                    value += self.weights['pair']
-            elif count == 3:
-                if tile in ["東", "南", "西", "北", "中", "發", "白"]:
-                    value += self.weights['honor_triple']
-                else:
-                    value += self.weights['triple']
-            elif count == 1:
-                value += self.weights['single']
-                
-        # 計算順子
-        value += self._evaluate_sequences(hand)
-        
-        return value
-        
-    def _evaluate_sequences(self, hand):
-        """評估順子和準順子"""
-        value = 0.0
-        numbers = defaultdict(list)
-        
-        # 整理數字牌
-        for tile in hand:
-            if tile.endswith('萬'):
-                num = int(tile[0])
-                numbers[num].append(tile)
-                
-        # 檢查順子
-        for i in range(1, 8):
-            if all(numbers[i+j] for j in range(3)):
-                value += self.weights['sequence']
-            elif len([j for j in range(3) if numbers[i+j]]) == 2:
-                value += self.weights['one_away']
-            elif len([j for j in range(3) if numbers[i+j]]) == 1:
-                value += self.weights['two_away']
-                
-        return value
-        
-    def _evaluate_positions(self, hand):
-        """評估牌的位置價值"""
-        value = 0.0
-        for tile in hand:
-            if tile.endswith('萬'):
-                num = int(tile[0])
-                if num in [1, 9]:
-                    value += self.weights['terminal']
-                elif num in [4, 5, 6]:
-                    value += self.weights['middle']
-                elif num in [3, 7]:
-                    value += self.weights['near_middle']
-            else:  # 字牌
-                value += self.weights['honor']
-                
-        return value
-        
-    def _evaluate_progress(self, hand):
-        """評估手牌進展程度"""
-        value = 0.0
-        numbers = defaultdict(int)
-        
-        # 計算數字牌的靈活度
-        for tile in hand:
-            if tile.endswith('萬'):
-                num = int(tile[0])
-                numbers[num] += 1
-                
-                # 檢查相鄰數字
-                if numbers[num-1] > 0 or numbers[num+1] > 0:
-                    value += self.weights['flexible']
-                else:
-                    value += self.weights['isolated']
-                    
-        return value
-        
-    def _evaluate_defense(self, hand):
-        """評估防禦價值"""
-        value = 0.0
-        
-        # 簡單的防禦評估：字牌和19較安全
-        for tile in hand:
-            if tile in ["東", "南", "西", "北", "中", "發", "白"]:
-                value += self.weights['safe_tile']
-            elif tile.endswith('萬'):
-                num = int(tile[0])
-                if num in [1, 9]:
-                    value += self.weights['safe_tile']
-                elif num in [4, 5, 6]:
-                    value += self.weights['risky_tile']
-                    
+        value = self._cache_get(hand.key)
+        if value is None:
+            # 與 evaluate_hands 用同一種加總方式，單手與整批的結果逐位元相同
+            value = float((hand_features(hand.counts) * self._weight_vector).sum())
+            self._cache_put(hand.key, value)
         return value
-        
+
+    def evaluate_hands(self, counts, check_waiting=True):
+        """
+        一次評估多手牌。counts 為 (N, 16) 張數陣列，回傳 (N,) 價值陣列；
+        與逐一呼叫 evaluate_hand 的結果相同（空手牌為 -10）。
+        """
+        counts = np.asarray(counts)
+        values = (hand_features(counts, check_waiting) * self._weight_vector).sum(axis=1)
+        values[counts.sum(1) == 0] = -10.0
+        return values
+
     def is_waiting(self, hand):
         """檢查是否聽牌"""
-        all_tiles = [f"{i}萬" for i in range(1, 10)] * 4 + \
-                   ["東", "南", "西", "北", "中", "發", "白"] * 4
-                   
-        for tile in set(all_tiles):
-            test_hand = hand + [tile]
-            if is_hu(test_hand):
-                return True
-        return False
-        
-    def _has_potential_high_score(self, hand):
-        """評估是否有可能胡大牌"""
-        # 檢查是否有字牌刻子可能
-        counts = Counter(hand)
-        honor_pairs = sum(1 for t, c in counts.items() 
-                         if t in ["東", "南", "西", "北", "中", "發", "白"] and c >= 2)
-                         
-        # 檢查是否有清一色可能
-        all_numbers = all(t.endswith('萬') for t in hand)
-        
-        return honor_pairs >= 2 or all_numbers
-        
+        return is_waiting(hand)
+
+    def decide(self, hand, melds=(), last_discard=None):
+        """
+        對目前局面一次評估所有合法選項，回傳 Decision。
+        hand：手牌 (Hand，不會被修改)；melds：已有的副露；
+        last_discard：對手剛打出的牌，None 表示輪到自己打牌。
+        吃/碰時一併決定接著要打的牌，呼叫端不必再問一次。
+        """
+        meld_count = len(melds)
+        log = self.log_decisions and _decision_log.isEnabledFor(logging.DEBUG)
+
+        # 輪到自己：能自摸就胡，否則打價值最高的牌
+        if last_discard is None:
+            if is_hu(hand, meld_count):
+                if log:
+                    _decision_log.debug("%s decides to hu", self.role)
+                return Decision('hu')
+            ranked = self.rank_discards(hand)
+            if log:
+                _decision_log.debug("%s decides to discard %s", self.role, tile_name(ranked[0][0]))
+            return Decision('discard', discard=ranked[0][0], values=dict(ranked))
+
+        # 對這張棄牌的合法反應，直接查反應表
+        reactions = claim_table(hand, meld_count)[last_discard]
+
+        # 如果可以胡牌，就胡牌
+        if ('hu',) in reactions:
+            if log:
+                _decision_log.debug("%s decides to hu", self.role)
+            return Decision('hu')
+
+        current_value = self.evaluate_hand(hand)
+        values = {'pass': current_value}
+        after = {}  # 選項 -> 吃碰槓後的手牌
+
+        for reaction in reactions:
+            test_hand = hand.copy()
+            if reaction[0] == 'gang':
+                # 計算槓後的手牌價值（包括槓的獎勵）
+                test_hand.remove(last_discard, 3)
+                values['gang'] = self.evaluate_hand(test_hand) + self.weights['triple'] * 1.5
+            elif reaction[0] == 'peng':
+                # 計算碰後的手牌價值（包括刻子獎勵）
+                test_hand.remove(last_discard, 2)
+                values['peng'] = self.evaluate_hand(test_hand) + self.weights['triple']
+            else:
+                # 計算吃後的手牌價值（包括順子獎勵）
+                for tile in reaction[1]:
+                    if tile != last_discard:
+                        test_hand.remove(tile)
+                values[reaction] = self.evaluate_hand(test_hand) + self.weights['sequence']
+            after[reaction[0] if reaction[0] != 'chi' else reaction] = test_hand
+
+        # 優先順序與以往相同：槓、碰、最好的吃，只要比不動好就做
+        chi_options = [r for r in reactions if r[0] == 'chi']
+        best_chi = max(chi_options, key=values.get, default=None)  # 同分取第一個
+        if values.get('gang', float('-inf')) > current_value:
+            if log:
+                _decision_log.debug("%s decides to gang", self.role)
+            return Decision('gang', values=values)
+        for option, action, chi in (('peng', 'peng', None),
+                                    (best_chi, 'chi', best_chi and list(best_chi[1]))):
+            if option is not None and values.get(option, float('-inf')) > current_value:
+                discard = self.rank_discards(after[option])[0][0]
+                if log:
+                    _decision_log.debug("%s decides to %s %s (then discard %s)", self.role, action,
+                                        [tile_name(t) for t in chi] if chi else tile_name(last_discard),
+                                        tile_name(discard))
+                return Decision(action, chi=chi, discard=discard, values=values)
+        return Decision('pass', values=values)
+
     def choose_action(self, hand, last_discard=None):
-        """選擇行動（胡、槓、碰、吃、打牌）"""
+        """
+        選擇行動（胡、槓、碰、吃、打牌）；舊介面，副露數視為 0。
+        回傳 'hu'/'gang'/'peng'、吃牌組合 (list) 或要打的牌。新程式請用 decide()。
+        """
         if not hand:
             return None
+        if last_discard is None:
+            best_discard = self.rank_discards(hand)[0][0]
+            if _decision_log.isEnabledFor(logging.DEBUG):
+                _decision_log.debug("%s decides to discard %s", self.role, tile_name(best_discard))
+            return best_discard
+        decision = self.decide(hand, (), last_discard)
+        if decision.action == 'chi':
+            return decision.chi  # 返回具體的吃牌組合
+        if decision.action == 'pass':
+            return self.rank_discards(hand)[0][0]
+        return decision.action
 
-        # 如果可以胡牌，就胡牌
-        if last_discard and can_hu_with_tile(hand, 0, last_discard):
-            print(f"{self.role} decides to hu")
-            return 'hu'
-            
-        # 如果可以槓牌，評估是否要槓
-        if last_discard and can_gang(hand, last_discard, is_self_drawn=False):
-            # 評估槓後的手牌價值
-            test_hand = hand.copy()
-            for _ in range(3):
-                test_hand.remove(last_discard)
-            # 計算槓後的手牌價值（包括槓的獎勵）
-            gang_value = self.evaluate_hand(test_hand) + self.weights['triple'] * 1.5
-            if gang_value > self.evaluate_hand(hand):
-                print(f"{self.role} decides to gang")
-                return 'gang'
-            
-        # 如果可以碰牌，評估是否要碰
-        if last_discard and can_peng(hand, last_discard):
-            # 評估碰後的手牌價值
-            test_hand = hand.copy()
-            test_hand.remove(last_discard)
-            test_hand.remove(last_discard)
-            # 計算碰後的手牌價值（包括刻子獎勵）
-            peng_value = self.evaluate_hand(test_hand) + self.weights['triple']
-            if peng_value > self.evaluate_hand(hand):
-                print(f"{self.role} decides to peng")
-                return 'peng'
-            
-        # 如果可以吃牌，評估最佳吃牌方式
-        if last_discard:
-            chi_options = get_chi_options(hand, last_discard)
-            if chi_options:
-                best_value = float('-inf')
-                best_option = None
-                current_value = self.evaluate_hand(hand)
-                
-                for option in chi_options:
-                    test_hand = hand.copy()
-                    # 移除需要的牌
-                    for tile in option:
-                        if tile != last_discard and tile in test_hand:
-                            test_hand.remove(tile)
-                    # 計算吃後的手牌價值（包括順子獎勵）
-                    chi_value = self.evaluate_hand(test_hand) + self.weights['sequence']
-                    
-                    if chi_value > best_value:
-                        best_value = chi_value
-                        best_option = option
-                        
-                if best_value > current_value and best_option:
-                    print(f"{self.role} decides to chi {best_option}")
-                    return best_option  # 返回具體的吃牌組合
-        
-        # 選擇要打出的牌
-        best_discard = None
-        best_value = float('-inf')
-        
-        for tile in hand:
-            test_hand = hand.copy()
-            test_hand.remove(tile)
-            value = self.evaluate_hand(test_hand)
-            
-            # 如果這張牌是安全牌，提高其價值
-            if tile in ["東", "南", "西", "北", "中", "發", "白"] or \
-               (tile.endswith('萬') and tile[0] in ['1', '9']):
-                value += self.weights['safe_tile']
-                
-            if value > best_value:
-                best_value = value
-                best_discard = tile
-                
-        print(f"{self.role} decides to discard {best_discard}")
-        return best_discard
+    def rank_discards(self, hand):
+        """
+        一次評估所有不同的可打牌，回傳 [(牌, 價值), ...]，價值由高到低；
+        同分時依牌的編號順序。每種牌只算一次：快取沒有的候選疊成 (N, 16) 矩陣，
+        每列少一張候選牌，整批交給 evaluate_hands。
+        """
+        kinds = hand.kinds()
+        keys = [key_remove(hand.key, tile) for tile in kinds]
+        values = np.array([self._cache_get(key) for key in keys], dtype=float)
+
+        # 快取裡沒有的才整批計算
+        missing = np.flatnonzero(np.isnan(values))
+        if len(missing):
+            counts = np.tile(hand.counts, (len(missing), 1))
+            counts[np.arange(len(missing)), np.take(kinds, missing)] -= 1
+            # 只有門清 14 張打一張才可能聽牌；打牌不會讓向聽數變小，
+            # 整手還差一向聽以上時每個候選都不可能聽牌，省掉逐列的聽牌檢查
+            computed = self.evaluate_hands(counts, check_waiting=len(hand) == 14 and shanten(hand) <= 0)
+            values[missing] = computed
+            for i, value in zip(missing.tolist(), computed.tolist()):
+                self._cache_put(keys[i], value)
+
+        # 如果這張牌是安全牌，提高其價值
+        safe = np.array([tile >= HONOR_START or tile in (0, 8) for tile in kinds])
+        values[safe] += self.weights['safe_tile']
+
+        return sorted(zip(kinds, values.tolist()), key=lambda kv: -kv[1])
         
     def update_statistics(self, result):
         """更新統計資料並可能進行權重探索"""
@@ -346,53 +555,36 @@ class MahjongAgent:
         self.current_session_games += 1
             
         self.games_since_last_exploration = self.games_since_last_exploration + 1
-        
-        # 每隔固定場數考慮是否進行探索
-        if self.games_since_last_exploration >= self.exploration_interval:
+
+        # 有待評估的新權重時在固定場次做序貫檢定，結果明確就不必等滿探索間隔
+        evaluated = False
+        if hasattr(self, 'pending_evaluation'):
+            verdict = self.sequential_test()
+            if verdict is not None or self.games_since_last_exploration >= self.exploration_interval:
+                self.finish_evaluation(verdict)
+                evaluated = True
+        
+        # 每隔固定場數（或剛評估完）考慮是否進行探索
+        if evaluated or self.games_since_last_exploration >= self.exploration_interval:
             # print(f"達到探索間隔 ({self.exploration_interval} 場)，重置計數器")
             self.games_since_last_exploration = 0
-            print(f"觸發探索檢查點 (遊戲場次: {self.current_session_games})")
+            _log.info("觸發探索檢查點 (遊戲場次: %d)", self.current_session_games)
             
             if self.current_session_games > 0:  # 確保有足夠的數據來計算勝率
                 current_win_rate = self.current_session_wins / self.current_session_games
-                print(f"當前回合勝率: {current_win_rate:.2%}")
+                _log.info("當前回合勝率: %.2f%%", current_win_rate * 100)
                 
                 # 如果還沒有基準勝率，設定當前勝率為基準
                 if not self.has_baseline:
                     self.best_win_rate = current_win_rate
                     self.best_weights = copy.deepcopy(self.weights)
                     self.has_baseline = True
-                    print("設定初始基準勝率:", self.best_win_rate)
+                    _log.info("設定初始基準勝率: %s", self.best_win_rate)
                 
                 # 開始探索新的權重組合
                 
-                # 如果有待評估的權重，進行評估
-                if hasattr(self, 'pending_evaluation'):
-                    current_win_rate = self.current_session_wins / self.current_session_games if self.current_session_games > 0 else 0
-                    old_win_rate = (self.pending_evaluation['old_stats']['wins'] / 
-                                  self.pending_evaluation['old_stats']['total_games'])
-                    
-                    print(f"評估新權重效果 - 新勝率: {current_win_rate:.2%}, 舊勝率: {old_win_rate:.2%}")
-                    
-                    # 如果新權重沒有帶來足夠的改善，恢復舊權重
-                    if current_win_rate < old_win_rate + self.improvement_threshold:
-                        print("新權重效果不佳，恢復舊權重")
-                        self.weights = self.pending_evaluation['old_weights']
-                        self.current_session_wins = self.pending_evaluation['old_stats']['wins']
-                        self.current_session_losses = self.pending_evaluation['old_stats']['losses']
-                        self.current_session_draws = self.pending_evaluation['old_stats']['draws']
-                        self.current_session_games = self.pending_evaluation['old_stats']['total_games']
-                    else:
-                        print("保留新權重組合")
-                        if current_win_rate > self.best_win_rate:
-                            self.best_win_rate = current_win_rate
-                            self.best_weights = copy.deepcopy(self.weights)
-                            print(f"更新最佳勝率: {self.best_win_rate:.2%}")
-                    
-                    delattr(self, 'pending_evaluation')
-                
                 if random.random() < self.exploration_rate:
-                    print("開始探索新的權重組合")
+                    _log.info("開始探索新的權重組合")
                     new_weights = self.explore_weights()
                     # 保存當前權重和統計數據
                     old_weights = copy.deepcopy(self.weights)
@@ -416,10 +608,76 @@ class MahjongAgent:
                         'old_weights': old_weights,
                         'old_stats': old_stats
                     }
-                    print("已設置新的權重組合，等待評估")
+                    _log.info("已設置新的權重組合，等待評估")
         
-        # 每次更新後都保存模型
-        self.save_model()
+        # 依存檔策略交給背景執行緒保存
+        self._unsaved_games += 1
+        self.checkpoint()
+        
+    def sequential_test(self):
+        """
+        待評估新權重的貝氏停止規則：以均勻先驗，由目前的勝場/其他場算出
+        勝率超過「舊勝率 + 提升閾值」的後驗機率 q。
+        只在固定的場次檢查（evaluation_min_games 起每 evaluation_look_interval 場），
+        每看一次都多一次誤接受的機會，所以接受門檻用 evaluation_alpha 除以檢查次數，
+        整個評估誤接受的機率不超過 evaluation_alpha。evaluation_beta 則是每次檢查的門檻，
+        重複檢查會讓誤拒絕多一些（只是少留一組權重，代價較小）。
+        回傳 True（q >= 1 - 每次的 alpha，接受）、
+        False（q <= evaluation_beta，拒絕）或 None（還要再打）。
+        """
+        games = self.current_session_games
+        if games < self.evaluation_min_games \
+                or (games - self.evaluation_min_games) % self.evaluation_look_interval:
+            return None
+        looks = max(1, (self.exploration_interval - self.evaluation_min_games)
+                    // self.evaluation_look_interval + 1)
+        old_stats = self.pending_evaluation['old_stats']
+        target = min(old_stats['wins'] / old_stats['total_games'] + self.improvement_threshold, 0.999)
+        q = _posterior_above(self.current_session_wins, games, target)
+        if q >= 1 - self.evaluation_alpha / looks:
+            return True
+        if q <= self.evaluation_beta:
+            return False
+        return None
+
+    def finish_evaluation(self, verdict):
+        """
+        結束待評估的新權重：verdict 為 sequential_test 的結果；
+        None 表示打滿探索間隔仍未分出，改用固定的提升閾值判斷。
+        """
+        current_win_rate = self.current_session_wins / self.current_session_games if self.current_session_games > 0 else 0
+        old_win_rate = (self.pending_evaluation['old_stats']['wins'] / 
+                      self.pending_evaluation['old_stats']['total_games'])
+        
+        _log.info("評估新權重效果 - 新勝率: %.2f%%, 舊勝率: %.2f%%", current_win_rate * 100, old_win_rate * 100)
+        if verdict is None:
+            verdict = current_win_rate >= old_win_rate + self.improvement_threshold
+            _log.info("打滿 %d 場仍未分出，以提升閾值判斷", self.current_session_games)
+        else:
+            _log.info("序貫評估在 %d 場後分出結果", self.current_session_games)
+        self.evaluation_history.append({
+            'games': self.current_session_games,
+            'win_rate': current_win_rate,
+            'accepted': verdict,
+            'early': self.current_session_games < self.exploration_interval,
+        })
+        
+        # 如果新權重沒有帶來足夠的改善，恢復舊權重
+        if not verdict:
+            _log.info("新權重效果不佳，恢復舊權重")
+            self.weights = self.pending_evaluation['old_weights']
+            self.current_session_wins = self.pending_evaluation['old_stats']['wins']
+            self.current_session_losses = self.pending_evaluation['old_stats']['losses']
+            self.current_session_draws = self.pending_evaluation['old_stats']['draws']
+            self.current_session_games = self.pending_evaluation['old_stats']['total_games']
+        else:
+            _log.info("保留新權重組合")
+            if current_win_rate > self.best_win_rate:
+                self.best_win_rate = current_win_rate
+                self.best_weights = copy.deepcopy(self.weights)
+                _log.info("更新最佳勝率: %.2f%%", self.best_win_rate * 100)
+        
+        delattr(self, 'pending_evaluation')
         
     def get_statistics(self):
         """獲取統計資料"""
@@ -431,58 +689,97 @@ class MahjongAgent:
         draw_rate = self.draws / self.total_games
         return win_rate, loss_rate, draw_rate
         
+    def model_state(self):
+        """目前模型狀態的快照（寫入 mahjong_agent.pkl 的 dict）"""
+        return {
+            'weights': dict(self.weights),
+            'best_weights': dict(self.best_weights),
+            'wins': self.wins,
+            'losses': self.losses,
+            'draws': self.draws,
+            'total_games': self.total_games,
+            'best_win_rate': self.best_win_rate,
+            'games_since_last_exploration': self.games_since_last_exploration,
+            'has_baseline': self.has_baseline,
+            'current_session_wins': self.current_session_wins,
+            'current_session_losses': self.current_session_losses,
+            'current_session_draws': self.current_session_draws,
+            'current_session_games': self.current_session_games
+        }
+
+    def checkpoint(self):
+        """未存檔的場數或時間到了就交給背景執行緒存檔，不阻塞對局"""
+        if (self._unsaved_games >= self.checkpoint_games
+                or time.monotonic() - self._last_checkpoint >= self.checkpoint_seconds):
+            self.save_model_async()
+
+    def save_model_async(self, path=None):
+        """把目前狀態交給背景執行緒保存"""
+        _model_writer.submit(path or self.model_path, self.model_state())
+        self._unsaved_games = 0
+        self._last_checkpoint = time.monotonic()
+
+    def flush(self):
+        """存下還沒存的戰績並等背景寫入完成（程式結束時會自動呼叫）"""
+        if self._unsaved_games:
+            self.save_model_async()
+        _model_writer.flush()
+
     def save_model(self, path=None):
-        """保存模型到文件"""
+        """立即保存模型到文件（暫存檔 + 換名）"""
         if path is None:
-            path = 'mahjong_agent.pkl'
+            path = self.model_path
             
         try:
-            model_state = {
-                'weights': self.weights,
-                'best_weights': self.best_weights,
-                'wins': self.wins,
-                'losses': self.losses,
-                'draws': self.draws,
-                'total_games': self.total_games,
-                'best_win_rate': self.best_win_rate,
-                'games_since_last_exploration': self.games_since_last_exploration,
-                'has_baseline': self.has_baseline,
-                'current_session_wins': self.current_session_wins,
-                'current_session_losses': self.current_session_losses,
-                'current_session_draws': self.current_session_draws,
-                'current_session_games': self.current_session_games
-            }
-            with open(path, 'wb') as f:
-                pickle.dump(model_state, f)
+            write_model(path, self.model_state())
+            self._unsaved_games = 0
+            self._last_checkpoint = time.monotonic()
             return True
         except Exception as e:
-            print(f"保存模型時發生錯誤: {e}")
+            _log.error("保存模型時發生錯誤: %s", e)
             return False
             
     def load_model(self, path=None):
-        """從文件載入模型"""
+        """
+        從文件載入模型（新格式或舊版 pickle 皆可）。
+        沒指定 path 時讀自己的模型檔，不存在再依序找舊版檔案；之後一律存到 model_path。
+        """
+        paths = (path,) if path is not None else (self.model_path,) + self.legacy_paths
+        path = next((p for p in paths if os.path.exists(p)), None)
         if path is None:
-            path = 'mahjong_agent.pkl'
+            return False
+        if path != paths[0]:
+            _log.info("%s 不存在，從 %s 載入", paths[0], path)
             
         try:
-            if os.path.exists(path):
-                with open(path, 'rb') as f:
-                    model_state = pickle.load(f)
-                    
-                self.weights = model_state['weights']
-                self.best_weights = model_state['best_weights']
-                self.wins = model_state['wins']
-                self.losses = model_state['losses']
-                self.draws = model_state['draws']
-                self.total_games = model_state['total_games']
-                self.best_win_rate = model_state['best_win_rate']
-                self.games_since_last_exploration = model_state['games_since_last_exploration']
-                self.has_baseline = model_state['has_baseline']
-                self.current_session_wins = model_state.get('current_session_wins', 0)
-                self.current_session_losses = model_state.get('current_session_losses', 0)
-                self.current_session_draws = model_state.get('current_session_draws', 0)
-                self.current_session_games = model_state.get('current_session_games', 0)
-                return True
+            model_state = read_model(path)
+            self.weights = _complete_weights(model_state['weights'])
+            self.best_weights = _complete_weights(model_state['best_weights'])
+            self.wins = model_state.get('wins', 0)
+            self.losses = model_state.get('losses', 0)
+            self.draws = model_state.get('draws', 0)
+            self.total_games = model_state.get('total_games', 0)
+            self.best_win_rate = model_state.get('best_win_rate', 0.0)
+            self.games_since_last_exploration = model_state.get('games_since_last_exploration', 0)
+            self.has_baseline = model_state.get('has_baseline', False)
+            self.current_session_wins = model_state.get('current_session_wins', 0)
+            self.current_session_losses = model_state.get('current_session_losses', 0)
+            self.current_session_draws = model_state.get('current_session_draws', 0)
+            self.current_session_games = model_state.get('current_session_games', 0)
+            return True
         except Exception as e:
-            print(f"載入模型時發生錯誤: {e}")
+            _log.error("載入模型時發生錯誤: %s", e)
         return False
+
+
+_agents = {}
+
+def get_agent(role="player"):
+    """
+    整個程式每個角色共用一個 MahjongAgent：模型只在第一次取用時載入，
+    之後每局都拿同一個實例，存檔由它的存檔策略與結束時的 flush 處理。
+    """
+    agent = _agents.get(role)
+    if agent is None:
+        agent = _agents[role] = MahjongAgent(role=role)
+    return agent
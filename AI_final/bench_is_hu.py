@@ -0,0 +1,51 @@
+"""
+比較逐一呼叫 is_hu 與 is_hu_batch 的速度。
+用法：python bench_is_hu.py [-n 手數] [--melds 副露組數]
+"""
+import argparse
+import time
+import numpy as np
+
+from mahjong_logic import Hand, is_hu, is_hu_batch, decode_counts, get_hu_table
+
+def make_hands(n, meld_count, rng, table):
+    """一半是隨機發的手牌，一半從胡牌表抽，確保兩種結果都有。"""
+    size = 14 - 3 * meld_count
+    deck = np.repeat(np.arange(16), 4)
+    random_hands = np.zeros((n - n // 2, 16), dtype=np.int64)
+    for row in random_hands:
+        np.add.at(row, rng.choice(deck, size, replace=False), 1)
+
+    winning = [key for key, sets in table.items() if sets == 4 - meld_count]
+    picks = rng.choice(len(winning), n // 2)
+    winning_hands = np.array([decode_counts(winning[i]) for i in picks], dtype=np.int64)
+    return np.concatenate([random_hands, winning_hands])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", type=int, default=200000)
+    parser.add_argument("--melds", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    table = get_hu_table()
+    counts = make_hands(args.n, args.melds, rng, table)
+    rows = counts.tolist()
+
+    start = time.perf_counter()
+    scalar = [is_hu(Hand.from_counts(row), args.melds) for row in rows]
+    scalar_time = time.perf_counter() - start
+
+    is_hu_batch(counts[:1], args.melds)  # 先建好排序後的陣列
+    start = time.perf_counter()
+    batch = is_hu_batch(counts, args.melds)
+    batch_time = time.perf_counter() - start
+
+    assert batch.tolist() == scalar, "is_hu_batch 與 is_hu 結果不同"
+    print(f"{args.n} 手，胡牌 {int(batch.sum())} 手")
+    print(f"is_hu       {scalar_time:8.3f}s  {args.n / scalar_time:12,.0f} 手/秒")
+    print(f"is_hu_batch {batch_time:8.3f}s  {args.n / batch_time:12,.0f} 手/秒")
+    print(f"加速 {scalar_time / batch_time:.1f} 倍")
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
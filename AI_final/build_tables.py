@@ -0,0 +1,24 @@
+"""
+離線建立查表用的二進位檔：胡牌表 (hu_table.bin) 與門清計分表 (score_table.bin)。
+牌型規則改變後要重新執行：python build_tables.py
+"""
+import os
+import time
+
+from mahjong_logic import HU_TABLE_PATH, save_hu_table, load_hu_table
+from tai_shu import SCORE_TABLE_PATH, build_score_table
+
+def main():
+    start = time.perf_counter()
+    if os.path.exists(HU_TABLE_PATH):
+        os.remove(HU_TABLE_PATH)
+    table = load_hu_table(HU_TABLE_PATH)  # 檔案不在時會重新建表
+    save_hu_table(HU_TABLE_PATH)
+    print(f"{HU_TABLE_PATH}: {len(table)} 筆，{time.perf_counter() - start:.1f}s")
+
+    start = time.perf_counter()
+    n = build_score_table(SCORE_TABLE_PATH)
+    print(f"{SCORE_TABLE_PATH}: {n} 筆，{time.perf_counter() - start:.1f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,311 @@
+import logging
+import random
+from tai_shu import score_hand, ScoreResult
+
+from mahjong_logic import create_deck, deal_tiles, tile_name, Hand, HandState, NUM_TILE_KINDS
+import mahjong_log
+
+ROLES = ("player", "ai")
+
+_log = mahjong_log.get_logger("engine")
+
+def other_role(role):
+    """回傳對手角色。"""
+    return "ai" if role == "player" else "player"
+
+def action_name(action):
+    """動作的可讀字串，例如 ('chi', (0, 1, 2)) -> 'chi 1萬+2萬+3萬'。"""
+    if len(action) == 1:
+        return action[0]
+    arg = action[1]
+    if isinstance(arg, (tuple, list)):
+        return f"{action[0]} {'+'.join(tile_name(t) for t in arg)}"
+    return f"{action[0]} {tile_name(arg)}"
+
+
+class GameState:
+    """
+    不依賴 tkinter 的二人麻將遊戲狀態。
+
+    遊戲流程以 step(action) 推進，每一步只有一個角色 (current) 需要做決定：
+    - phase == 'discard'：current 手上多一張牌，可以自摸 ('hu',)、
+      暗槓 ('gang', tile) 或打牌 ('discard', tile)。
+    - phase == 'react'：current 對 last_discard 反應，可以胡 ('hu',)、
+      槓 ('gang',)、碰 ('peng',)、吃 ('chi', 三張牌) 或略過 ('pass',)。
+    - phase == 'over'：遊戲結束，result 為 'player_win'/'ai_win'/'draw'。
+    牌一律使用整數編號 (0-15)，手牌為 mahjong_logic.Hand。
+    deck 可給定牌山（list 或 create_decks 的一列）；沒給時以 rng（種子或亂數產生器）洗牌。
+    """
+
+    log_steps = True  # determinize 出來的模擬牌局不記錄每一步
+
+    def __init__(self, deck=None, dealer="player", rng=None):
+        mahjong_log.start_game()
+        if deck is None:
+            deck = create_deck(rng)
+        player_hand, ai_hand, self.deck = deal_tiles(deck, dealer=dealer)
+        # 吃碰槓資格與聽牌由 HandState 增量維護；hands/melds 是同一份物件
+        self.states = {"player": HandState(player_hand), "ai": HandState(ai_hand)}
+        self.hands = {role: st.hand for role, st in self.states.items()}
+        self.melds = {role: st.melds for role, st in self.states.items()}
+        self.discards = {"player": [], "ai": []}
+        self.current = dealer
+        self.phase = "discard"
+        self.last_discard = None
+        self.last_drawn = None   # current 最新摸到的牌
+        self.result = None
+        self.winner = None
+        self.win_tile = None
+        self.self_drawn = False
+        self.deck_left_at_win = None
+
+    def determinize(self, role, rng=None):
+        """
+        從 role 的角度複製一份可以繼續玩的狀態：role 看得到的（自己的手牌、
+        雙方副露與棄牌）照舊，看不到的對手手牌與牌山從剩下的牌隨機重抽。
+        給蒙地卡羅模擬用；rng 為 random.Random（預設全域 random）。
+        """
+        rng = rng if rng is not None else random
+        opponent = other_role(role)
+        unseen = [4] * NUM_TILE_KINDS
+        for tile in self.hands[role]:
+            unseen[tile] -= 1
+        for r in ROLES:
+            for tile in self.discards[r]:
+                unseen[tile] -= 1
+            for meld in self.melds[r]:
+                for tile in meld:
+                    unseen[tile] -= 1
+        pool = [tile for tile, n in enumerate(unseen) for _ in range(n)]
+        rng.shuffle(pool)
+        n = len(self.hands[opponent])
+
+        world = GameState.__new__(GameState)
+        world.__dict__.update(self.__dict__)
+        hands = {role: self.hands[role].copy(), opponent: Hand(pool[:n])}
+        world.states = {r: HandState(hands[r], [list(m) for m in self.melds[r]]) for r in ROLES}
+        world.hands = {r: st.hand for r, st in world.states.items()}
+        world.melds = {r: st.melds for r, st in world.states.items()}
+        world.discards = {r: list(d) for r, d in self.discards.items()}
+        world.deck = pool[n:]
+        world.log_steps = False
+        return world
+
+    def is_over(self):
+        return self.phase == "over"
+
+    def legal_actions(self):
+        """列出 current 目前所有合法動作。"""
+        if self.phase == "over":
+            return []
+
+        st = self.states[self.current]
+        actions = []
+
+        if self.phase == "discard":
+            if st.is_hu():
+                actions.append(("hu",))
+            kinds = st.hand.kinds()
+            for tile in kinds:
+                if st.concealed_gang[tile]:
+                    actions.append(("gang", tile))
+            for tile in kinds:
+                actions.append(("discard", tile))
+            return actions
+
+        # 反應表每回合只算一次，之後直接查
+        actions.extend(st.claims[self.last_discard])
+        actions.append(("pass",))
+        return actions
+
+    def step(self, action):
+        """執行 current 的動作並推進到下一個需要決定的狀態。"""
+        if self.phase == "over":
+            raise ValueError("遊戲已結束")
+
+        if self.log_steps and _log.isEnabledFor(logging.DEBUG):
+            _log.debug("%s (%s): %s", self.current, self.phase, action_name(action))
+        kind = action[0]
+        if self.phase == "discard":
+            if kind == "hu":
+                self._hu_self_drawn()
+            elif kind == "gang":
+                self._concealed_gang(action[1])
+            elif kind == "discard":
+                self._discard(action[1])
+            else:
+                raise ValueError(f"出牌階段不能執行 {action}")
+        else:
+            if kind == "hu":
+                self._hu_discard()
+            elif kind == "gang":
+                self._claim_gang()
+            elif kind == "peng":
+                self._claim_peng()
+            elif kind == "chi":
+                self._claim_chi(action[1])
+            elif kind == "pass":
+                self._pass()
+            else:
+                raise ValueError(f"反應階段不能執行 {action}")
+        return self
+
+    # --- 出牌階段 ---
+    def _hu_self_drawn(self):
+        if not self.states[self.current].is_hu():
+            raise ValueError("不能自摸")
+        self._finish(self.current, self.last_drawn, self_drawn=True)
+
+    def _concealed_gang(self, tile):
+        self.states[self.current].declare_gang(tile)
+        self._draw(self.current)
+
+    def _discard(self, tile):
+        st = self.states[self.current]
+        if tile not in st.hand:
+            raise ValueError(f"手牌中沒有 {tile_name(tile)}")
+        st.discard(tile)
+        self.discards[self.current].append(tile)
+        self.last_discard = tile
+        self.last_drawn = None
+        self.current = other_role(self.current)
+        self.phase = "react"
+
+    # --- 反應階段 ---
+    def _hu_discard(self):
+        st = self.states[self.current]
+        if not st.can_hu(self.last_discard):
+            raise ValueError(f"不能胡 {tile_name(self.last_discard)}")
+        st.draw(self.last_discard)
+        self._finish(self.current, self.last_discard, self_drawn=False)
+
+    def _claim_gang(self):
+        self.states[self.current].claim_gang(self.last_discard)
+        self._take_discard()
+        self._draw(self.current)
+
+    def _claim_peng(self):
+        self.states[self.current].claim_peng(self.last_discard)
+        self._take_discard()
+        self.phase = "discard"
+
+    def _claim_chi(self, seq):
+        self.states[self.current].claim_chi(self.last_discard, seq)
+        self._take_discard()
+        self.phase = "discard"
+
+    def _pass(self):
+        self.last_discard = None
+        self._draw(self.current)
+
+    # --- 共用 ---
+    def _take_discard(self):
+        """被吃碰槓的牌從打出者的棄牌區移走。"""
+        self.discards[other_role(self.current)].pop()
+        self.last_discard = None
+
+    def _draw(self, role):
+        """role 摸一張牌；牌山用完則和局。"""
+        if not self.deck:
+            self.last_drawn = None
+            self._finish(None, None)
+            return
+        self.last_drawn = self.deck.pop()
+        self.states[role].draw(self.last_drawn)
+        self.phase = "discard"
+
+    def _finish(self, winner, tile, self_drawn=False):
+        self.phase = "over"
+        self.winner = winner
+        self.win_tile = tile
+        self.self_drawn = self_drawn
+        self.deck_left_at_win = len(self.deck)
+        self.result = f"{winner}_win" if winner else "draw"
+        _log.debug("遊戲結束：%s，剩 %d 張", self.result, self.deck_left_at_win)
+
+    def score(self):
+        """
+        計算贏家的牌型與台數，回傳 tai_shu.ScoreResult
+        （可直接拆成 (牌型列表, 台數)）。
+        """
+        if self.winner is None:
+            return ScoreResult([], 0)
+        return score_hand(self.hands[self.winner], self.melds[self.winner],
+                          self.self_drawn, self.deck_left_at_win)
+
+
+class RandomPolicy:
+    """一般 AI：能胡就胡、能槓就槓、能碰就碰，一半機率吃，隨機打牌。"""
+
+    def __init__(self, rng=None):
+        self.rng = rng if rng is not None else random
+
+    def __call__(self, state, actions):
+        kinds = {a[0]: a for a in actions}
+        for kind in ("hu", "gang", "peng"):
+            # 一般 AI 不做暗槓
+            if kind in kinds and not (kind == "gang" and state.phase == "discard"):
+                return kinds[kind]
+        if state.phase == "react":
+            chi = [a for a in actions if a[0] == "chi"]
+            if chi and self.rng.random() < 0.5:
+                return self.rng.choice(chi)
+            return ("pass",)
+        return ("discard", self.rng.choice(list(state.hands[state.current])))
+
+
+class AgentPolicy:
+    """
+    用 MahjongAgent.decide 做決定。
+    吃/碰的決定裡已經算好接著要打的牌，下一次輪到出牌時直接沿用。
+    """
+
+    def __init__(self, agent):
+        self.agent = agent
+        self._follow_up = None  # (吃碰後的手牌 key, 要打的牌)
+
+    def __call__(self, state, actions):
+        hand = state.hands[state.current]
+        melds = state.melds[state.current]
+        if state.phase == "discard":
+            if ("hu",) in actions:
+                return ("hu",)
+            follow_up, self._follow_up = self._follow_up, None
+            if follow_up is not None and follow_up[0] == hand.key:
+                return ("discard", follow_up[1])
+            choice = self.agent.decide(hand, melds, None).discard
+            if choice is None or choice not in hand:
+                choice = next(iter(hand))  # 預設選第一張
+            return ("discard", choice)
+
+        decision = self.agent.decide(hand, melds, state.last_discard)
+        if decision.action == "chi":
+            action = ("chi", tuple(decision.chi))
+        else:
+            action = (decision.action,)
+        if action not in actions:
+            return ("pass",)
+        if decision.discard is not None:
+            # 吃碰後的手牌：先扣掉要用的牌
+            after = hand.copy()
+            if decision.action == "peng":
+                after.remove(state.last_discard, 2)
+            else:
+                for t in decision.chi:
+                    if t != state.last_discard:
+                        after.remove(t)
+            self._follow_up = (after.key, decision.discard)
+        return action
+
+
+def play_game(policies, deck=None, dealer="player", rng=None):
+    """
+    無介面地跑完一局。
+    policies：{'player': policy, 'ai': policy}，policy(state, actions) 回傳動作。
+    deck/rng 同 GameState，給定種子時整局可重現。
+    回傳結束時的 GameState。
+    """
+    state = GameState(deck=deck, dealer=dealer, rng=rng)
+    while state.phase != "over":
+        state.step(policies[state.current](state, state.legal_actions()))
+    return state
@@ -0,0 +1,138 @@
+"""
+麻將程式的 logging：每個子系統一個 logger (mahjong.<子系統>)，輸出等級各自設定。
+- agent：模型載入/存檔、權重探索與評估
+- decision：agent 每一步的決定（預設不輸出）
+- engine：GameState 每一步執行的動作（預設不輸出）
+訊息一律用 logging 的 %-格式，沒有輸出就不組字串；熱路徑要先算參數時用
+isEnabledFor 判斷，關掉的等級整段跳過。
+等級可用環境變數 MAHJONG_LOG 設定，例如 MAHJONG_LOG="decision=DEBUG,agent=WARNING"，
+或在程式裡呼叫 configure / set_level。
+
+另外可開啟決策 ring buffer（enable_decision_buffer）：decision 與 engine 的紀錄
+不論輸出等級都先留在記憶體，每局只保留最後 n 筆，事後用 recent_decisions 查看。
+"""
+import logging
+import os
+from collections import deque
+
+ROOT = "mahjong"
+DEFAULT_LEVELS = {"agent": logging.INFO, "decision": logging.WARNING, "engine": logging.WARNING}
+BUFFERED_SUBSYSTEMS = ("decision", "engine")
+
+_console_levels = dict(DEFAULT_LEVELS)  # 子系統 -> 輸出等級
+_buffer = None
+
+
+def get_logger(subsystem):
+    """子系統的 logger（mahjong.<subsystem>）。"""
+    return logging.getLogger(f"{ROOT}.{subsystem}")
+
+def _to_level(level):
+    if isinstance(level, int):
+        return level
+    value = logging.getLevelName(str(level).upper())
+    if not isinstance(value, int):
+        raise ValueError(f"未知的 log 等級 {level}")
+    return value
+
+def _apply(subsystem):
+    # logger 的等級取輸出與 ring buffer 需要的較低者；輸出與否再由 handler 的 filter 決定
+    level = _console_levels.get(subsystem, logging.INFO)
+    if _buffer is not None and subsystem in BUFFERED_SUBSYSTEMS:
+        level = min(level, logging.DEBUG)
+    get_logger(subsystem).setLevel(level)
+
+def set_level(subsystem, level):
+    """設定子系統的輸出等級（名稱或數字）。"""
+    _console_levels[subsystem] = _to_level(level)
+    _apply(subsystem)
+
+def configure(spec=None):
+    """
+    依 "子系統=等級,..." 設定輸出等級；只寫等級（如 "DEBUG"）時套用到所有子系統。
+    spec 為 None 時讀環境變數 MAHJONG_LOG。
+    """
+    if spec is None:
+        spec = os.environ.get("MAHJONG_LOG", "")
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        if "=" in item:
+            subsystem, level = item.split("=", 1)
+            set_level(subsystem.strip(), level.strip())
+        else:
+            for subsystem in list(_console_levels):
+                set_level(subsystem, item)
+
+
+class _ConsoleFilter(logging.Filter):
+    """只放行達到該子系統輸出等級的紀錄（logger 本身可能為了 ring buffer 開得更低）。"""
+
+    def filter(self, record):
+        subsystem = record.name[len(ROOT) + 1:]
+        return record.levelno >= _console_levels.get(subsystem, logging.INFO)
+
+
+class DecisionBuffer(logging.Handler):
+    """
+    每局最後 maxlen 筆紀錄的 ring buffer。存的是 LogRecord，
+    要看的時候才組訊息；start_game 時把上一局留在 previous。
+    """
+
+    def __init__(self, maxlen=200):
+        super().__init__(logging.DEBUG)
+        self.records = deque(maxlen=maxlen)
+        self.previous = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+    def start_game(self):
+        self.previous = list(self.records)
+        self.records.clear()
+
+    def lines(self, previous=False):
+        records = self.previous if previous else self.records
+        return [f"{r.name[len(ROOT) + 1:]}: {r.getMessage()}" for r in records]
+
+
+def enable_decision_buffer(maxlen=200):
+    """開啟（或調整大小）決策 ring buffer，回傳 DecisionBuffer。"""
+    global _buffer
+    disable_decision_buffer()
+    _buffer = DecisionBuffer(maxlen)
+    for subsystem in BUFFERED_SUBSYSTEMS:
+        get_logger(subsystem).addHandler(_buffer)
+        _apply(subsystem)
+    return _buffer
+
+def disable_decision_buffer():
+    global _buffer
+    if _buffer is None:
+        return
+    for subsystem in BUFFERED_SUBSYSTEMS:
+        get_logger(subsystem).removeHandler(_buffer)
+    _buffer = None
+    for subsystem in BUFFERED_SUBSYSTEMS:
+        _apply(subsystem)
+
+def start_game():
+    """新的一局開始（GameState 建立時呼叫）；沒開 ring buffer 時什麼都不做。"""
+    if _buffer is not None:
+        _buffer.start_game()
+
+def recent_decisions(previous=False):
+    """目前這局（previous=True 時為上一局）ring buffer 裡的訊息。"""
+    return _buffer.lines(previous) if _buffer is not None else []
+
+
+def _setup():
+    root = logging.getLogger(ROOT)
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    handler.addFilter(_ConsoleFilter())
+    root.addHandler(handler)
+    root.propagate = False
+    for subsystem in _console_levels:
+        _apply(subsystem)
+    configure()
+
+_setup()
@@ -1,30 +1,250 @@
+import os
 import random
-from collections import Counter
-
-def create_deck():
-    """生成 1-9 萬 + 東南西北中發白 各 4 張，並隨機洗牌。"""
-    tiles  = [f"{i}萬" for i in range(1, 10)] * 4
-    honors = ["東", "南", "西", "北", "中", "發", "白"] * 4
-    deck = tiles + honors
-    random.shuffle(deck)
+import struct
+from array import array
+from functools import lru_cache
+import numpy as np
+
+# 牌的整數編號：0-8 為 1-9 萬，9-15 為 東南西北中白發（與 tai_shu.tile_order 相同）
+TILE_NAMES = [f"{i}萬" for i in range(1, 10)] + ["東", "南", "西", "北", "中", "白", "發"]
+TILE_IDS = {name: i for i, name in enumerate(TILE_NAMES)}
+NUM_TILE_KINDS = 16
+HONOR_START = 9  # 編號 >= 9 的是字牌
+
+HU_TABLE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "hu_table.bin")
+HU_TABLE_MAGIC = b"HUTB"
+HU_TABLE_VERSION = 1   # key 編碼或建表規則改變時要加一，舊檔會重建
+_HU_HEADER = struct.Struct("<4sIQ")  # magic, 版本, 筆數
+_hu_table = None
+
+def tile_name(tile):
+    """整數編號 -> 牌名（只在介面顯示時使用）。"""
+    return TILE_NAMES[tile]
+
+def tile_id(name):
+    """牌名 -> 整數編號。"""
+    return TILE_IDS[name]
+
+def is_honor(tile):
+    return tile >= HONOR_START
+
+# --- 壓縮手牌編碼 ---
+# 16 種牌各佔 3 bits（0-4 張），整手牌是一個 48 bits 的整數，
+# 可直接當 dict / 快取的 key，兩手牌相等就是兩個整數相等。
+
+TILE_BITS = 3
+_FIELD_MASK = (1 << TILE_BITS) - 1
+# 偶數格的 3 bits；每格上方空出的 3 bits 當借位的保護位
+_EVEN_FIELDS = sum(_FIELD_MASK << (2 * TILE_BITS * j) for j in range(NUM_TILE_KINDS // 2))
+_EVEN_GUARDS = sum(1 << (2 * TILE_BITS * j + TILE_BITS) for j in range(NUM_TILE_KINDS // 2))
+
+def encode_counts(counts):
+    """16 格張數 list -> 壓縮整數。"""
+    key = 0
+    for t, c in enumerate(counts):
+        key += c << (TILE_BITS * t)
+    return key
+
+def decode_counts(key):
+    """壓縮整數 -> 16 格張數 list。"""
+    return [(key >> (TILE_BITS * t)) & _FIELD_MASK for t in range(NUM_TILE_KINDS)]
+
+def encode_tiles(tiles):
+    """整數編號的牌列表 -> 壓縮整數。"""
+    key = 0
+    for t in tiles:
+        key += 1 << (TILE_BITS * t)
+    return key
+
+def encode_names(names):
+    """牌名列表（如 ["1萬", "東"]）-> 壓縮整數。"""
+    return encode_tiles(TILE_IDS[n] for n in names)
+
+def decode_names(key):
+    """壓縮整數 -> 依編號排序的牌名列表。"""
+    return [TILE_NAMES[t] for t, c in enumerate(decode_counts(key)) for _ in range(c)]
+
+def key_count(key, tile):
+    return (key >> (TILE_BITS * tile)) & _FIELD_MASK
+
+def key_size(key):
+    """總張數。"""
+    total = 0
+    while key:
+        total += key & _FIELD_MASK
+        key >>= TILE_BITS
+    return total
+
+def key_add(key, tile, n=1):
+    """加入 n 張 tile；每種牌最多 4 張。"""
+    if key_count(key, tile) + n > 4:
+        raise ValueError(f"{TILE_NAMES[tile]} 超過 4 張")
+    return key + (n << (TILE_BITS * tile))
+
+def key_remove(key, tile, n=1):
+    """移除 n 張 tile；張數不足時丟出 ValueError。"""
+    if key_count(key, tile) < n:
+        raise ValueError(f"沒有 {n} 張 {TILE_NAMES[tile]}")
+    return key - (n << (TILE_BITS * tile))
+
+def key_is_subset(small, big):
+    """
+    small 的每種牌張數都不超過 big 時回傳 True。
+    奇偶格分開處理，讓每格上方都有空位放保護位，一次減法比完 8 格。
+    """
+    for shift in (0, TILE_BITS):
+        a = (small >> shift) & _EVEN_FIELDS
+        b = (big >> shift) & _EVEN_FIELDS
+        if ((b | _EVEN_GUARDS) - a) & _EVEN_GUARDS != _EVEN_GUARDS:
+            return False
+    return True
+
+def key_difference(big, small):
+    """big 拿掉 small 的牌；small 必須是 big 的子集合。"""
+    if not key_is_subset(small, big):
+        raise ValueError("不是子集合")
+    return big - small
+
+
+class Hand:
+    """
+    用 16 格張數向量表示的手牌：counts[t] 是編號 t 的牌有幾張。
+    介面刻意和 list 相近（len、in、count、remove、迭代），
+    迭代時依編號由小到大列出每一張牌。
+    key 是同步維護的壓縮整數（見 encode_counts），可直接拿來查表或當快取 key。
+    """
+    __slots__ = ("counts", "size", "key")
+
+    def __init__(self, tiles=()):
+        self.counts = [0] * NUM_TILE_KINDS
+        self.size = 0
+        self.key = 0
+        for t in tiles:
+            self.add(t)
+
+    @classmethod
+    def from_counts(cls, counts):
+        hand = cls()
+        hand.counts = list(counts)
+        hand.size = sum(hand.counts)
+        hand.key = encode_counts(hand.counts)
+        return hand
+
+    @classmethod
+    def from_key(cls, key):
+        return cls.from_counts(decode_counts(key))
+
+    @classmethod
+    def from_names(cls, names):
+        return cls(TILE_IDS[n] for n in names)
+
+    def copy(self):
+        hand = Hand.__new__(Hand)
+        hand.counts = self.counts.copy()
+        hand.size = self.size
+        hand.key = self.key
+        return hand
+
+    def add(self, tile, n=1):
+        self.counts[tile] += n
+        self.size += n
+        self.key += n << (3 * tile)
+
+    def remove(self, tile, n=1):
+        if self.counts[tile] < n:
+            raise ValueError(f"手牌中沒有 {n} 張 {TILE_NAMES[tile]}")
+        self.counts[tile] -= n
+        self.size -= n
+        self.key -= n << (3 * tile)
+
+    def count(self, tile):
+        return self.counts[tile]
+
+    def kinds(self):
+        """手上有的牌種（編號由小到大）。"""
+        return [t for t, c in enumerate(self.counts) if c]
+
+    def names(self):
+        return [TILE_NAMES[t] for t in self]
+
+    def is_subset(self, other):
+        """self 的每種牌都不多於 other。"""
+        return key_is_subset(self.key, other.key)
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, tile):
+        return 0 <= tile < NUM_TILE_KINDS and self.counts[tile] > 0
+
+    def __iter__(self):
+        for t, c in enumerate(self.counts):
+            for _ in range(c):
+                yield t
+
+    def __eq__(self, other):
+        return isinstance(other, Hand) and self.counts == other.counts
+
+    def __repr__(self):
+        return f"Hand({self.names()})"
+
+
+def _resolve_rng(rng):
+    """
+    rng 可以是 None（全域 random）、整數種子、random.Random 或 np.random.Generator。
+    整數種子轉成 random.Random，其餘原樣回傳。
+    """
+    if rng is None:
+        return random
+    if isinstance(rng, (int, np.integer)):
+        return random.Random(int(rng))
+    return rng
+
+_DECK_TEMPLATE = np.repeat(np.arange(NUM_TILE_KINDS, dtype=np.int8), 4)
+
+def create_deck(rng=None):
+    """
+    生成 1-9 萬 + 東南西北中發白 各 4 張（整數編號），並隨機洗牌。
+    rng：None（全域 random）、整數種子、random.Random 或 np.random.Generator；
+    給定種子時牌山可完全重現。
+    """
+    rng = _resolve_rng(rng)
+    if isinstance(rng, np.random.Generator):
+        return rng.permutation(_DECK_TEMPLATE).tolist()
+    deck = list(range(NUM_TILE_KINDS)) * 4
+    rng.shuffle(deck)
     return deck
 
+def create_decks(n, rng=None):
+    """
+    一次生成 n 副洗好的牌山，回傳 (n, 64) 的 int8 陣列，每列可直接給 deal_tiles。
+    rng 同 create_deck；整數種子與 random.Random 會轉成 np.random.Generator。
+    """
+    if not isinstance(rng, np.random.Generator):
+        seed = rng if isinstance(rng, (int, np.integer)) else _resolve_rng(rng).getrandbits(64)
+        rng = np.random.default_rng(seed)
+    return rng.permuted(np.tile(_DECK_TEMPLATE, (n, 1)), axis=1)
+
 def deal_tiles(deck, dealer="player"):
     """
     發牌：每人 13 張，莊家(dealer)額外補 1 張。
-    回傳 (player_hand, ai_hand, deck)
+    deck 可以是 list 或 create_decks 的一列；牌從尾端發，和逐張 pop() 的結果相同。
+    回傳 (player_hand, ai_hand, deck)，手牌為 Hand，deck 為剩下的牌 (list)。
     """
-    player = [deck.pop() for _ in range(13)]
-    ai     = [deck.pop() for _ in range(13)]
+    if not isinstance(deck, list):
+        deck = deck.tolist() if hasattr(deck, "tolist") else list(deck)
+    player = Hand(deck[-13:])
+    ai     = Hand(deck[-26:-13])
     if dealer == "player":
-        player.append(deck.pop())
+        player.add(deck[-27])
     else:
-        ai.append(deck.pop())
+        ai.add(deck[-27])
+    del deck[-27:]
     return player, ai, deck
 
 def can_peng(hand, tile):
     """若手牌中有兩張 tile，則可碰。"""
-    return hand.count(tile) >= 2
+    return hand.counts[tile] >= 2
 
 def can_gang(hand, tile, is_self_drawn=False):
     """
@@ -34,24 +254,24 @@ def can_gang(hand, tile, is_self_drawn=False):
     """
     if is_self_drawn:
         # 暗槓 - 手牌中有四張相同的牌
-        return hand.count(tile) >= 4
+        return hand.counts[tile] >= 4
     else:
         # 明槓 - 手牌中有三張相同的牌
-        return hand.count(tile) >= 3
+        return hand.counts[tile] >= 3
 
 def get_chi_options(hand, tile):
     """
     回傳所有可用此 tile 組成的順子三張牌列表（限萬子）。
-    例如 tile="3萬"，若手牌有 "1萬","2萬"，就會回傳 ["1萬","2萬","3萬"]。
+    例如 tile=2 (3萬)，若手牌有 0 (1萬), 1 (2萬)，就會回傳 [0, 1, 2]。
     """
     options = []
-    if not tile.endswith("萬"):
+    if tile >= HONOR_START:
         return options
-    num = int(tile[0])
-    for start in (num-2, num-1, num):
-        if 1 <= start <= 7:
-            seq = [f"{start+i}萬" for i in (0,1,2)]
-            if all(hand.count(s) >= 1 for s in seq if s != tile):
+    counts = hand.counts
+    for start in (tile-2, tile-1, tile):
+        if 0 <= start <= 6:
+            seq = [start, start+1, start+2]
+            if all(counts[s] >= 1 for s in seq if s != tile):
                 options.append(seq)
     return options
 
@@ -59,68 +279,511 @@ def can_chi(hand, tile):
     """只要有一組可吃的順子即回 True。"""
     return bool(get_chi_options(hand, tile))
 
-def _can_form_melds_count(counts, needed_sets):
-    """
-    遞迴檢查 counts（Counter）能否湊出 needed_sets 個「刻子(3同)或順子(3連)」，
-    且用完所有牌。
-    """
-    if needed_sets == 0:
-        return not counts
-
-    if not counts:
-        return False
-
-    tile = next(iter(counts))
-    cnt  = counts[tile]
-
-    # 刻子
-    if cnt >= 3:
-        newc = counts.copy()
-        newc[tile] -= 3
-        if newc[tile] == 0:
-            del newc[tile]
-        if _can_form_melds_count(newc, needed_sets - 1):
-            return True
-
-    # 順子（萬子）
-    if tile.endswith("萬"):
-        num = int(tile[0])
-        for start in (num-2, num-1, num):
-            if 1 <= start <= 7:
-                seq = [f"{start+i}萬" for i in (0,1,2)]
-                if all(counts.get(s,0) >= 1 for s in seq):
-                    newc = counts.copy()
-                    for s in seq:
-                        newc[s] -= 1
-                        if newc[s] == 0:
-                            del newc[s]
-                    if _can_form_melds_count(newc, needed_sets - 1):
-                        return True
-
-    return False
+def build_hu_table():
+    """
+    列舉所有「1 對眼 + 0~4 組刻子/順子」且每種牌不超過 4 張的組合。
+    回傳 dict：壓縮後的張數向量 -> 面子組數。
+    """
+    # 每組面子用 (用到的牌, 張數) 表示：16 種刻子 + 7 種順子
+    sets = [((i,), 3) for i in range(16)] + [((i, i + 1, i + 2), 1) for i in range(7)]
+    counts = [0] * 16
+    table = {}
+
+    def add_pairs(n):
+        for i in range(16):
+            if counts[i] <= 2:
+                counts[i] += 2
+                table[encode_counts(counts)] = n
+                counts[i] -= 2
+
+    def extend(first, n):
+        add_pairs(n)
+        if n == 4:
+            return
+        for k in range(first, len(sets)):
+            tiles, cnt = sets[k]
+            if all(counts[i] + cnt <= 4 for i in tiles):
+                for i in tiles:
+                    counts[i] += cnt
+                extend(k, n + 1)
+                for i in tiles:
+                    counts[i] -= cnt
+
+    extend(0, 0)
+    return table
+
+def save_hu_table(path=HU_TABLE_PATH):
+    """
+    把胡牌表存成二進位檔：16 bytes 檔頭 (HU_TABLE_MAGIC, 版本, 筆數)，
+    接著每筆 64 bits（key << 3 | 面子組數）。寫到暫存檔再換名。
+    """
+    table = get_hu_table()
+    data = array("Q", ((key << 3) | n for key, n in table.items()))
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(_HU_HEADER.pack(HU_TABLE_MAGIC, HU_TABLE_VERSION, len(data)))
+        data.tofile(f)
+    os.replace(tmp, path)
+
+def _read_hu_table(path):
+    """讀胡牌表檔；不存在、檔頭或長度不符時回傳 None。"""
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as f:
+        raw = f.read()
+    if len(raw) < _HU_HEADER.size:
+        return None
+    magic, version, n = _HU_HEADER.unpack_from(raw)
+    if magic != HU_TABLE_MAGIC or version != HU_TABLE_VERSION \
+            or len(raw) != _HU_HEADER.size + 8 * n:
+        return None
+    data = array("Q")
+    data.frombytes(raw[_HU_HEADER.size:])
+    return {v >> 3: v & 7 for v in data}
+
+def load_hu_table(path=HU_TABLE_PATH):
+    """從檔案載入胡牌表；檔案不存在、被截斷或版本不符時重新建表。"""
+    global _hu_table, _hu_arrays
+    table = _read_hu_table(path)
+    _hu_table = table if table is not None else build_hu_table()
+    _hu_arrays = None  # 批次查表用的陣列要重建
+    return _hu_table
+
+def get_hu_table():
+    """目前載入的胡牌表；第一次使用時才讀檔或建表。"""
+    if _hu_table is None:
+        load_hu_table()
+    return _hu_table
 
 def is_hu(concealed_hand, meld_count=0):
     """
     標準胡牌判定：4 組 (刻子/順子) + 1 對眼。
-    concealed_hand：除去副露後的手牌 list。
+    concealed_hand：除去副露後的手牌 (Hand)。
     meld_count：已副露組數（吃/碰/槓），預設 0。
+    直接查預先建好的胡牌表，O(1) 判定。
     """
-    counts = Counter(concealed_hand)
-    needed_sets = 4 - meld_count
-
-    # 嘗試當眼
-    for tile, cnt in list(counts.items()):
-        if cnt >= 2:
-            newc = counts.copy()
-            newc[tile] -= 2
-            if newc[tile] == 0:
-                del newc[tile]
-            if _can_form_melds_count(newc, needed_sets):
-                return True
-    return False
+    table = _hu_table if _hu_table is not None else get_hu_table()
+    return table.get(concealed_hand.key) == 4 - meld_count
 
 def can_hu_with_tile(concealed_hand, meld_count, tile):
     """
     假設補上對方打出的 tile，再判斷能否胡。
     """
-    return is_hu(concealed_hand + [tile], meld_count)
\ No newline at end of file
+    table = _hu_table if _hu_table is not None else get_hu_table()
+    key = concealed_hand.key + (1 << (3 * tile))
+    return table.get(key) == 4 - meld_count
+
+# --- 批次胡牌判定 (numpy) ---
+
+_KEY_WEIGHTS = np.array([1 << (TILE_BITS * i) for i in range(NUM_TILE_KINDS)], dtype=np.uint64)
+_hu_arrays = None
+
+def _get_hu_arrays():
+    """胡牌表排成兩個 numpy 陣列 (排序後的 key, 面子組數)，給批次查表用。"""
+    global _hu_arrays
+    if _hu_arrays is None:
+        table = get_hu_table()
+        keys = np.fromiter(table.keys(), dtype=np.uint64, count=len(table))
+        sets = np.fromiter(table.values(), dtype=np.int8, count=len(table))
+        order = np.argsort(keys)
+        _hu_arrays = (keys[order], sets[order])
+    return _hu_arrays
+
+def encode_counts_batch(counts):
+    """(N, 16) 張數陣列 -> (N,) uint64 壓縮 key，與 encode_counts 相同。"""
+    return np.asarray(counts).astype(np.uint64) @ _KEY_WEIGHTS
+
+def is_hu_batch(counts, meld_counts=0):
+    """
+    一次判定多手牌是否胡牌，結果與逐一呼叫 is_hu 相同。
+    counts：(N, 16) 張數陣列；meld_counts：整數或長度 N 的陣列。
+    整批轉成壓縮 key 後在排序好的胡牌表上 searchsorted，回傳 (N,) bool 陣列。
+    """
+    counts = np.asarray(counts)
+    keys, sets = _get_hu_arrays()
+    # 張數超出 0-4 的列會把壓縮欄位溢位，直接當作不胡
+    valid = ((counts >= 0) & (counts <= 4)).all(axis=1)
+    query = encode_counts_batch(np.where(valid[:, None], counts, 0))
+    idx = np.minimum(np.searchsorted(keys, query), len(keys) - 1)
+    return valid & (keys[idx] == query) & (sets[idx] == 4 - np.asarray(meld_counts))
+
+# --- 聽牌 ---
+
+@lru_cache(maxsize=4096)
+def _winning_tiles(key, meld_count):
+    counts = decode_counts(key)
+    needed = 4 - meld_count
+    if sum(counts) != 3 * needed + 1:
+        return frozenset()
+
+    waits = set()
+    rest = []  # 沒組進面子的牌（依編號由小到大），最多 4 張
+
+    def classify():
+        if len(rest) == 1:                      # 單騎
+            waits.add(rest[0])
+            return
+        a, b, c, d = rest
+        for pair, (x, y) in (((a, b), (c, d)), ((b, c), (a, d)), ((c, d), (a, b))):
+            if pair[0] != pair[1]:
+                continue
+            if x == y:                          # 雙碰
+                waits.add(x)
+            elif y < HONOR_START and y - x == 1:    # 兩面/邊張
+                if x >= 1:
+                    waits.add(x - 1)
+                if y <= 7:
+                    waits.add(y + 1)
+            elif y < HONOR_START and y - x == 2:    # 嵌張
+                waits.add(x + 1)
+
+    def search(i):
+        while i < NUM_TILE_KINDS and counts[i] == 0:
+            i += 1
+        if i == NUM_TILE_KINDS:
+            classify()
+            return
+        if counts[i] >= 3:
+            counts[i] -= 3; search(i); counts[i] += 3
+        if i <= 6 and counts[i+1] and counts[i+2]:
+            counts[i] -= 1; counts[i+1] -= 1; counts[i+2] -= 1
+            search(i)
+            counts[i] += 1; counts[i+1] += 1; counts[i+2] += 1
+        if len(rest) < 4:
+            counts[i] -= 1; rest.append(i)
+            search(i)
+            rest.pop(); counts[i] += 1
+
+    search(0)
+    # 手上已經有 4 張的牌不可能再摸到
+    return frozenset(t for t in waits if counts[t] < 4)
+
+def winning_tiles(hand, meld_count=0):
+    """
+    一次拆牌找出所有聽的牌，回傳 frozenset；沒聽牌則為空集合。
+    結果以手牌的壓縮 key 快取，「能不能胡這張」只是一次集合查詢。
+    """
+    return _winning_tiles(hand.key, meld_count)
+
+def live_winning_tiles(hand, meld_count, visible):
+    """
+    回傳 {聽的牌: 還剩幾張}。
+    visible：已看得到的牌張數（16 格 list 或 Counter），例如雙方棄牌與副露。
+    """
+    counts = hand.counts
+    return {t: max(0, 4 - counts[t] - visible[t]) for t in winning_tiles(hand, meld_count)}
+
+# --- 向聽數 (shanten) ---
+
+_SUIT_MASK = (1 << 27) - 1  # key 的低 27 bits 是 1-9 萬的張數
+
+def _pareto(options):
+    """去掉被支配的 (面子數, 搭子數, 是否留眼) 組合。"""
+    return tuple(o for o in options
+                 if not any(q != o and q[0] >= o[0] and q[0] + q[1] >= o[0] + o[1] and q[2] >= o[2]
+                            for q in options))
+
+@lru_cache(maxsize=1 << 16)
+def _suit_options(suit_key):
+    """
+    萬子部分所有拆法的 (面子數, 搭子數, 是否留眼) 組合，只保留不被支配的組合。
+    每次拿掉最小那張牌所在的面子/搭子/孤張後遞迴，子問題以剩下的壓縮張數快取，
+    不同手牌之間也能共用；手牌只改變字牌時完全不用重算。
+    """
+    if suit_key == 0:
+        return ((0, 0, 0),)
+    low = suit_key & -suit_key
+    i = (low.bit_length() - 1) // 3
+    u0 = 1 << (3 * i)
+    c0 = (suit_key >> (3 * i)) & 7
+    c1 = (suit_key >> (3 * i + 3)) & 7 if i <= 7 else 0
+    c2 = (suit_key >> (3 * i + 6)) & 7 if i <= 6 else 0
+    u1, u2 = u0 << 3, u0 << 6
+    found = set()
+
+    def take(sub_key, dm, dt, eye):
+        for m, t, p in _suit_options(sub_key):
+            if eye:
+                if p:
+                    continue
+                p = 1
+            found.add((m + dm, t + dt, p))
+
+    if c0 >= 3:                                     # 刻子
+        take(suit_key - 3 * u0, 1, 0, False)
+    if c1 and c2:                                   # 順子
+        take(suit_key - u0 - u1 - u2, 1, 0, False)
+    if c0 >= 2:                                     # 對子：當眼或當搭子
+        take(suit_key - 2 * u0, 0, 0, True)
+        take(suit_key - 2 * u0, 0, 1, False)
+    if c1:                                          # 兩面/邊張搭子
+        take(suit_key - u0 - u1, 0, 1, False)
+    if c2:                                          # 嵌張搭子
+        take(suit_key - u0 - u2, 0, 1, False)
+    take(suit_key - u0, 0, 0, False)                # 孤張
+    return _pareto(found)
+
+def _honor_summary(counts):
+    """字牌只能組刻子或對子：回傳 (刻子數, 對子數)。"""
+    sets = pairs = 0
+    for t in range(HONOR_START, NUM_TILE_KINDS):
+        c = counts[t]
+        if c >= 3:
+            sets += 1
+        elif c == 2:
+            pairs += 1
+    return sets, pairs
+
+def _combine_shanten(suit_key, honor_sets, honor_pairs, meld_count):
+    needed = 4 - meld_count
+    best = 2 * needed
+    for m, t, p in _suit_options(suit_key):
+        m += honor_sets
+        for use_honor_eye in (False, True):
+            if use_honor_eye and (p or not honor_pairs):
+                continue
+            eye = 1 if (p or use_honor_eye) else 0
+            blocks = t + honor_pairs - (1 if use_honor_eye else 0)
+            sets = min(m, needed)
+            blocks = min(blocks, needed - sets)
+            value = 2 * needed - 2 * sets - blocks - eye
+            if value < best:
+                best = value
+    return best
+
+def shanten(hand, meld_count=0):
+    """
+    向聽數：還差幾張牌才能聽牌。0 表示聽牌，-1 表示已經胡牌。
+    meld_count 為已副露組數，副露越多需要在手牌湊的面子越少。
+    """
+    sets, pairs = _honor_summary(hand.counts)
+    return _combine_shanten(hand.key & _SUIT_MASK, sets, pairs, meld_count)
+
+
+class ShantenTracker:
+    """
+    隨摸牌/打牌增量更新的向聽數。
+    字牌的刻子/對子數直接加減，萬子部分查 _suit_options 的快取，
+    所以每次更新只處理變動的那一張牌。
+    """
+
+    def __init__(self, hand, meld_count=0):
+        self.hand = hand.copy()
+        self.meld_count = meld_count
+        self.honor_sets, self.honor_pairs = _honor_summary(self.hand.counts)
+        self.value = self._compute()
+
+    def _compute(self):
+        return _combine_shanten(self.hand.key & _SUIT_MASK,
+                                self.honor_sets, self.honor_pairs, self.meld_count)
+
+    def _honor_change(self, tile, before, after):
+        if tile >= HONOR_START:
+            self.honor_sets += (after >= 3) - (before >= 3)
+            self.honor_pairs += (after == 2) - (before == 2)
+
+    def draw(self, tile):
+        """摸進一張牌，回傳新的向聽數。"""
+        before = self.hand.counts[tile]
+        self.hand.add(tile)
+        self._honor_change(tile, before, before + 1)
+        self.value = self._compute()
+        return self.value
+
+    def discard(self, tile):
+        """打出一張牌，回傳新的向聽數。"""
+        before = self.hand.counts[tile]
+        self.hand.remove(tile)
+        self._honor_change(tile, before, before - 1)
+        self.value = self._compute()
+        return self.value
+
+    def add_meld(self, tiles_from_hand):
+        """吃/碰/槓：從手牌移走 tiles_from_hand 並多一組副露。"""
+        for tile in tiles_from_hand:
+            before = self.hand.counts[tile]
+            self.hand.remove(tile)
+            self._honor_change(tile, before, before - 1)
+        self.meld_count += 1
+        self.value = self._compute()
+        return self.value
+
+    def after_discard(self, tile):
+        """不改變狀態，試算打出 tile 後的向聽數。"""
+        before = self.hand.counts[tile]
+        sets, pairs = self.honor_sets, self.honor_pairs
+        if tile >= HONOR_START:
+            sets += (before - 1 >= 3) - (before >= 3)
+            pairs += (before - 1 == 2) - (before == 2)
+        return _combine_shanten((self.hand.key - (1 << (3 * tile))) & _SUIT_MASK,
+                                sets, pairs, self.meld_count)
+
+
+# --- 反應表 ---
+
+def _build_chi_table():
+    """
+    _CHI_TABLE[t][window]：吃 t 能組成的順子。
+    window 的第 j 位表示手上有沒有 t-2+j（中間那位不看），共 16 x 32 格。
+    """
+    table = []
+    for tile in range(NUM_TILE_KINDS):
+        row = []
+        for window in range(32):
+            options = []
+            for start in (tile - 2, tile - 1, tile):
+                seq = (start, start + 1, start + 2)
+                if tile < HONOR_START and 0 <= start <= 6 and \
+                        all(window >> (t - tile + 2) & 1 for t in seq if t != tile):
+                    options.append(seq)
+            row.append(tuple(options))
+        table.append(row)
+    return table
+
+_CHI_TABLE = _build_chi_table()
+
+CLAIM_CACHE_SIZE = 4096
+
+@lru_cache(maxsize=CLAIM_CACHE_SIZE)
+def _claim_table(key, meld_count):
+    counts = decode_counts(key)
+    present = sum(1 << t for t in range(NUM_TILE_KINDS) if counts[t])
+    waits = _winning_tiles(key, meld_count)
+    table = []
+    for tile in range(NUM_TILE_KINDS):
+        reactions = []
+        if tile in waits:
+            reactions.append(("hu",))
+        if counts[tile] >= 3:
+            reactions.append(("gang",))
+        if counts[tile] >= 2:
+            reactions.append(("peng",))
+        for seq in _CHI_TABLE[tile][(present << 2 >> tile) & 0b11111]:
+            reactions.append(("chi", seq))
+        table.append(tuple(reactions))
+    return tuple(table)
+
+def claim_table(hand, meld_count=0):
+    """
+    對 16 種可能打進來的牌，一次列出所有合法反應：
+    table[tile] 依序為 ('hu',)、('gang',)、('peng',)、('chi', 順子)，沒有就是空 tuple。
+    手牌沒變時結果相同（以手牌 key 快取），每回合算一次，之後任何棄牌都只是查表。
+    動作格式與 GameState 反應階段相同（不含 ('pass',)）。
+    """
+    return _claim_table(hand.key, meld_count)
+
+
+# --- 手牌狀態 ---
+
+
+class HandState:
+    """
+    一個角色的手牌 (Hand) 與副露，並隨摸牌/打牌/吃碰槓增量維護：
+    - peng[t] / gang[t]：能不能碰、明槓別人打出的 t
+    - concealed_gang[t]：手上有沒有四張 t 可以暗槓
+    - present：手上有哪些牌的 16 位元遮罩，chi_options(t) 用它查 _CHI_TABLE
+    - waits：聽的牌（以手牌 key 查 winning_tiles 的快取，手牌變動時才重查）
+    - claims：16 格反應表 (claim_table)
+    張數改變時只更新那張牌的資格，對別人打出的牌做反應只是查表。
+    hand 與 melds 直接沿用傳入的物件。
+    """
+
+    def __init__(self, hand=None, melds=None):
+        self.hand = hand if hand is not None else Hand()
+        self.melds = melds if melds is not None else []
+        self.peng = [False] * NUM_TILE_KINDS
+        self.gang = [False] * NUM_TILE_KINDS
+        self.concealed_gang = [False] * NUM_TILE_KINDS
+        self.present = 0
+        self._waits = None
+        self._claims = None
+        for tile in range(NUM_TILE_KINDS):
+            self._changed(tile)
+
+    @property
+    def meld_count(self):
+        return len(self.melds)
+
+    @property
+    def waits(self):
+        if self._waits is None:
+            self._waits = winning_tiles(self.hand, self.meld_count)
+        return self._waits
+
+    @property
+    def claims(self):
+        """本回合的反應表 (claim_table)，手牌變動前只算一次。"""
+        if self._claims is None:
+            self._claims = claim_table(self.hand, self.meld_count)
+        return self._claims
+
+    def _changed(self, tile):
+        """tile 的張數變了：更新它的碰槓資格與 present 遮罩。"""
+        count = self.hand.counts[tile]
+        self.peng[tile] = count >= 2
+        self.gang[tile] = count >= 3
+        self.concealed_gang[tile] = count >= 4
+        if count:
+            self.present |= 1 << tile
+        else:
+            self.present &= ~(1 << tile)
+        self._waits = None
+        self._claims = None
+
+    def _take(self, tile, n=1):
+        self.hand.remove(tile, n)
+        self._changed(tile)
+
+    # --- 查詢 ---
+    def is_hu(self):
+        """手上的牌（含剛摸到的）是否已經胡牌。"""
+        return is_hu(self.hand, self.meld_count)
+
+    def can_hu(self, tile):
+        """能不能胡別人打出的 tile。"""
+        return tile in self.waits
+
+    def chi_options(self, tile):
+        """吃 tile 能組成的順子，與 get_chi_options 相同但為 tuple。"""
+        return _CHI_TABLE[tile][(self.present << 2 >> tile) & 0b11111]
+
+    # --- 更新 ---
+    def draw(self, tile):
+        """摸進（或胡進）一張牌。"""
+        self.hand.add(tile)
+        self._changed(tile)
+
+    def discard(self, tile):
+        """打出一張牌。"""
+        self._take(tile)
+
+    def claim_peng(self, tile):
+        """碰別人打出的 tile。"""
+        if not self.peng[tile]:
+            raise ValueError(f"不能碰 {tile_name(tile)}")
+        self._take(tile, 2)
+        self.melds.append([tile] * 3)
+
+    def claim_gang(self, tile):
+        """明槓別人打出的 tile。"""
+        if not self.gang[tile]:
+            raise ValueError(f"不能槓 {tile_name(tile)}")
+        self._take(tile, 3)
+        self.melds.append([tile] * 4)
+
+    def declare_gang(self, tile):
+        """暗槓手上的四張 tile。"""
+        if not self.concealed_gang[tile]:
+            raise ValueError(f"不能暗槓 {tile_name(tile)}")
+        self._take(tile, 4)
+        self.melds.append([tile] * 4)
+
+    def claim_chi(self, tile, seq):
+        """吃別人打出的 tile 組成順子 seq。"""
+        seq = tuple(seq)
+        if seq not in self.chi_options(tile):
+            raise ValueError(f"不能吃 {[tile_name(t) for t in seq]}")
+        for t in seq:
+            if t != tile:
+                self._take(t)
+        self.melds.append(list(seq))
@@ -1,7 +1,7 @@
 import tkinter as tk
 from mahjong_gui import MahjongGame
 import matplotlib.pyplot as plt
-from agent import MahjongAgent  # 新增 import
+from agent import get_agent
 
 game_num = 1000
 
@@ -61,6 +61,10 @@ class GameManager:
         self.agent_mode_button = tk.Button(self.control_frame, text="與強化學習AI對戰", command=lambda: self.start_player_mode("agent"))
         self.agent_mode_button.pack(side=tk.LEFT, padx=5)
 
+        # 添加與蒙地卡羅 AI 對戰按鈕
+        self.mc_mode_button = tk.Button(self.control_frame, text="與蒙地卡羅AI對戰", command=lambda: self.start_player_mode("mc"))
+        self.mc_mode_button.pack(side=tk.LEFT, padx=5)
+
         # 遊戲狀態
         self.is_testing = False
         self.game_window = None
@@ -153,7 +157,7 @@ class GameManager:
 
     def start_player_mode(self, opponent_type="normal"):
         """開始玩家模式
-        opponent_type: 'normal' 為一般AI，'agent' 為強化學習AI
+        opponent_type: 'normal' 為一般AI，'agent' 為強化學習AI，'mc' 為蒙地卡羅前瞻AI
         """
         # 創建新窗口用於玩家模式
         player_window = tk.Toplevel(self.root)
@@ -176,6 +180,8 @@ class GameManager:
         self.start_button.config(state=tk.NORMAL)
         self.stop_button.config(state=tk.DISABLED)
         self.player_mode_button.config(state=tk.NORMAL)  # 測試結束後重新啟用玩家模式按鈕
+        # 測試中共用的 agent 把還沒存的戰績寫入模型檔
+        get_agent("player").flush()
 
 if __name__ == "__main__":
     manager = GameManager(total_games=game_num)
@@ -0,0 +1,147 @@
+"""
+蒙地卡羅前瞻出牌策略。
+輪到自己打牌時，對候選的每張牌做模擬：用 GameState.determinize 從自己
+看得到的資訊重抽對手手牌與牌山，打出這張牌後雙方照 agent 的靜態策略往下走
+最多 horizon 步，以輸贏計分（沒走完時看雙方向聽數差）。
+候選是 agent 靜態排序的前 top_k 種牌，把有限的模擬次數集中在可能的選擇上；
+每一批重抽的牌局所有候選都打一次，比較時雜訊較小。時間或模擬次數用完時
+選平均分數最高的牌，同分時照 agent 原本的排序。
+對別人打的牌怎麼反應、能不能胡，仍交給 AgentPolicy。
+用法與 AgentPolicy 相同：policies["ai"] = MonteCarloPolicy(get_agent("ai"))
+"""
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from agent import MahjongAgent
+from mahjong_engine import AgentPolicy, other_role
+from mahjong_logic import shanten
+
+TIME_BUDGET = 0.5       # 每步最多思考幾秒
+MAX_ROLLOUTS = 600      # 每步最多模擬幾次（所有候選合計）
+ROLLOUT_HORIZON = 24    # 每次模擬最多走幾步（出牌與反應各算一步）
+CUTOFF_WEIGHT = 0.1     # 沒走完時，對手每多差一向聽加幾分
+TOP_K = 4               # 只模擬 agent 靜態排序的前幾張（None 為每一種牌）
+
+def _new_rollout_agent(weights, role):
+    agent = MahjongAgent(role, weights=weights)
+    agent.log_decisions = False
+    return agent
+
+def _outcome(world, role):
+    """模擬結束時 role 的分數：贏 1、輸 -1、和局 0，沒走完以向聽數差估計。"""
+    if world.phase == "over":
+        if world.winner is None:
+            return 0.0
+        return 1.0 if world.winner == role else -1.0
+    opponent = other_role(role)
+    mine = shanten(world.hands[role], len(world.melds[role]))
+    theirs = shanten(world.hands[opponent], len(world.melds[opponent]))
+    return CUTOFF_WEIGHT * (theirs - mine)
+
+def run_rollouts(state, candidates, agent, seed, time_budget, max_rollouts, horizon):
+    """
+    對 state.current 的每張候選牌做模擬，回傳 {牌: [總分, 次數]}。
+    每一批重抽的牌局用同一個種子給所有候選；至少跑完一批。
+    """
+    role = state.current
+    rng = random.Random(seed)
+    deadline = time.perf_counter() + time_budget
+    totals = {tile: [0.0, 0] for tile in candidates}
+    done = 0
+    while True:
+        world_seed = rng.getrandbits(32)
+        for tile in candidates:
+            world = state.determinize(role, random.Random(world_seed))
+            policies = {role: AgentPolicy(agent), other_role(role): AgentPolicy(agent)}
+            world.step(("discard", tile))
+            for _ in range(horizon):
+                if world.phase == "over":
+                    break
+                world.step(policies[world.current](world, world.legal_actions()))
+            totals[tile][0] += _outcome(world, role)
+            totals[tile][1] += 1
+        done += len(candidates)
+        if done + len(candidates) > max_rollouts or time.perf_counter() >= deadline:
+            return totals
+
+
+_worker_agent = None
+
+def _worker_rollouts(state, candidates, weights, seed, time_budget, max_rollouts, horizon):
+    """process pool 裡跑 run_rollouts；每個 worker 留一個模擬用的 agent。"""
+    global _worker_agent
+    if _worker_agent is None:
+        _worker_agent = _new_rollout_agent(weights, state.current)
+    elif _worker_agent.weights != weights:
+        _worker_agent.weights = dict(weights)
+    return run_rollouts(state, candidates, _worker_agent, seed, time_budget, max_rollouts, horizon)
+
+
+class MonteCarloPolicy:
+    """
+    policy(state, actions)：出牌用蒙地卡羅模擬，其餘交給 AgentPolicy(agent)。
+    time_budget / max_rollouts：每步的思考時間與模擬次數上限，先到者為準
+    horizon：每次模擬最多走幾步
+    top_k：只模擬靜態排序前幾張，None 為每一種可以打的牌
+    workers：大於 0 時把模擬分給這麼多個行程（用完呼叫 close）
+    last_stats：上一次出牌每張候選的 (平均分數, 模擬次數)
+    """
+
+    def __init__(self, agent, time_budget=TIME_BUDGET, max_rollouts=MAX_ROLLOUTS,
+                 horizon=ROLLOUT_HORIZON, top_k=TOP_K, workers=0, seed=None):
+        self.agent = agent
+        self.fallback = AgentPolicy(agent)
+        self.time_budget = time_budget
+        self.max_rollouts = max_rollouts
+        self.horizon = horizon
+        self.top_k = top_k
+        self.workers = workers
+        self.rng = random.Random(seed)
+        self.last_stats = None
+        self._rollout_agent = None
+        self._pool = None
+
+    def __call__(self, state, actions):
+        if state.phase != "discard" or ("hu",) in actions:
+            return self.fallback(state, actions)
+        legal = {a[1] for a in actions if a[0] == "discard"}
+        # 照 agent 的靜態排序，同分時保留它原本的選擇
+        candidates = [tile for tile, _ in self.agent.rank_discards(state.hands[state.current]) if tile in legal]
+        candidates = candidates[:self.top_k]
+        if len(candidates) == 1:
+            return ("discard", candidates[0])
+
+        totals = self._search(state, candidates)
+        self.last_stats = {tile: (total / n if n else 0.0, n) for tile, (total, n) in totals.items()}
+        best = max(candidates, key=lambda tile: self.last_stats[tile][0])
+        return ("discard", best)
+
+    def _search(self, state, candidates):
+        seed = self.rng.getrandbits(32)
+        if self.workers <= 0:
+            if self._rollout_agent is None:
+                self._rollout_agent = _new_rollout_agent(self.agent.weights, self.agent.role)
+            elif self._rollout_agent.weights != self.agent.weights:
+                self._rollout_agent.weights = dict(self.agent.weights)
+            return run_rollouts(state, candidates, self._rollout_agent, seed,
+                                self.time_budget, self.max_rollouts, self.horizon)
+
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        share = max(len(candidates), self.max_rollouts // self.workers)
+        jobs = [self._pool.submit(_worker_rollouts, state, candidates, self.agent.weights,
+                                  seed + i, self.time_budget, share, self.horizon)
+                for i in range(self.workers)]
+        totals = {tile: [0.0, 0] for tile in candidates}
+        for job in jobs:
+            for tile, (total, n) in job.result().items():
+                totals[tile][0] += total
+                totals[tile][1] += n
+        return totals
+
+    def close(self):
+        """關掉 process pool。"""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
@@ -0,0 +1,122 @@
+"""
+MahjongAgent 的模型檔格式。
+
+新格式（副檔名 .bin）：16 bytes 檔頭 (MODEL_MAGIC, 版本, 中繼資料長度, 特徵數 n)，
+接著是 UTF-8 JSON 中繼資料 {"features": [特徵名稱...], "meta": {戰績等}}，
+最後依 WEIGHT_ARRAYS 的順序各存 n 個 little-endian float64。
+讀檔不經過 pickle，也會檢查每個長度，來路不明的檔案最多只會讀取失敗。
+
+舊版 mahjong_agent.pkl 是 dict 的 pickle；read_model 依檔頭自動判斷，
+舊檔以不允許任何類別的 Unpickler 讀取（只接受 dict/list/數字/字串）。
+兩種格式讀出來都是同樣的 model_state dict：
+{'weights': {名稱: 值}, 'best_weights': {名稱: 值}, 'wins': ..., ...}
+"""
+import io
+import json
+import os
+import pickle
+import struct
+import threading
+
+import numpy as np
+
+MODEL_MAGIC = b"MJAG"
+MODEL_FORMAT_VERSION = 1   # 檔案結構改變時加一；較新的版本讀取時會報錯
+_HEADER = struct.Struct("<4sIII")  # magic, 版本, 中繼資料長度, 特徵數
+WEIGHT_ARRAYS = ("weights", "best_weights")
+
+_write_lock = threading.Lock()
+
+
+class _SafeUnpickler(pickle.Unpickler):
+    """不載入任何類別或函式，只剩內建的容器與數值。"""
+
+    def find_class(self, module, name):
+        raise pickle.UnpicklingError(f"模型檔不能含有物件 ({module}.{name})")
+
+
+def encode_model(model_state):
+    """model_state dict -> 新格式的 bytes；各權重陣列依 weights 的鍵順序存放。"""
+    features = list(model_state["weights"])
+    meta = {k: v for k, v in model_state.items() if k not in WEIGHT_ARRAYS}
+    meta_bytes = json.dumps({"features": features, "meta": meta}, ensure_ascii=False).encode("utf-8")
+    header = _HEADER.pack(MODEL_MAGIC, MODEL_FORMAT_VERSION, len(meta_bytes), len(features))
+    arrays = [np.array([model_state[name].get(f, np.nan) for f in features], dtype="<f8")
+              for name in WEIGHT_ARRAYS]
+    return b"".join([header, meta_bytes] + [a.tobytes() for a in arrays])
+
+def decode_model(data):
+    """新格式的 bytes -> model_state dict；格式不對時拋出 ValueError。"""
+    if len(data) < _HEADER.size:
+        raise ValueError("模型檔太短")
+    magic, version, meta_size, n = _HEADER.unpack_from(data)
+    if magic != MODEL_MAGIC:
+        raise ValueError("不是模型檔")
+    if version > MODEL_FORMAT_VERSION:
+        raise ValueError(f"模型檔版本 {version} 比程式支援的 {MODEL_FORMAT_VERSION} 新")
+    start = _HEADER.size + meta_size
+    if len(data) != start + 8 * n * len(WEIGHT_ARRAYS):
+        raise ValueError("模型檔長度不符")
+
+    try:
+        info = json.loads(data[_HEADER.size:start].decode("utf-8"))
+    except RecursionError:
+        raise ValueError("模型檔中繼資料格式不符") from None
+    if not isinstance(info, dict):
+        raise ValueError("模型檔中繼資料格式不符")
+    features, meta = info.get("features"), info.get("meta")
+    if not (isinstance(features, list) and len(features) == n
+            and all(isinstance(f, str) for f in features) and isinstance(meta, dict)):
+        raise ValueError("模型檔中繼資料格式不符")
+
+    model_state = dict(meta)
+    values = np.frombuffer(data, dtype="<f8", offset=start).reshape(len(WEIGHT_ARRAYS), n)
+    for name, row in zip(WEIGHT_ARRAYS, values.tolist()):
+        model_state[name] = dict(zip(features, row))
+    return model_state
+
+def model_file_info(path):
+    """
+    回傳 (格式, 版本)：新格式為 ('bin', 版本)，其餘當作舊版 ('pickle', None)。
+    依檔頭判斷，不看副檔名。
+    """
+    with open(path, "rb") as f:
+        head = f.read(_HEADER.size)
+    if len(head) == _HEADER.size and head[:len(MODEL_MAGIC)] == MODEL_MAGIC:
+        return "bin", _HEADER.unpack(head)[1]
+    return "pickle", None
+
+def read_model(path):
+    """讀取任一格式的模型檔，回傳 model_state dict；格式不對時拋出 ValueError。"""
+    with open(path, "rb") as f:
+        data = f.read()
+    if data[:len(MODEL_MAGIC)] == MODEL_MAGIC:
+        return decode_model(data)
+    try:
+        model_state = _SafeUnpickler(io.BytesIO(data)).load()
+    except Exception as e:
+        raise ValueError(f"無法讀取舊版模型檔: {e}") from e
+    if not (isinstance(model_state, dict) and all(isinstance(model_state.get(name), dict)
+                                                   for name in WEIGHT_ARRAYS)):
+        raise ValueError("舊版模型檔內容不符")
+    return model_state
+
+def write_model(path, model_state, fmt="bin"):
+    """
+    寫到暫存檔再換名，寫到一半中斷也不會弄壞原本的檔案。
+    fmt 為 'bin'（新格式）或 'pickle'（舊版，給還沒更新的程式讀）。
+    """
+    if fmt == "bin":
+        data = encode_model(model_state)
+    elif fmt == "pickle":
+        data = pickle.dumps(model_state)
+    else:
+        raise ValueError(f"不支援的模型格式 {fmt}")
+    tmp = path + ".tmp"
+    with _write_lock:
+        with open(tmp, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
@@ -0,0 +1,78 @@
+"""
+MahjongAgent 模型檔工具（新格式與舊版 pickle 都能讀）。
+用法：
+  python model_tool.py show mahjong_agent.bin
+  python model_tool.py diff mahjong_agent.pkl mahjong_agent.bin [--all]
+  python model_tool.py convert mahjong_agent.pkl mahjong_agent.bin [--format bin|pickle]
+"""
+import argparse
+import sys
+
+from model_format import WEIGHT_ARRAYS, model_file_info, read_model, write_model
+
+def _format_value(value):
+    return f"{value:.4f}" if isinstance(value, float) else str(value)
+
+def show(args):
+    fmt, version = model_file_info(args.path)
+    state = read_model(args.path)
+    print(f"{args.path}：{'新格式 v' + str(version) if fmt == 'bin' else '舊版 pickle'}")
+    for key, value in state.items():
+        if key not in WEIGHT_ARRAYS:
+            print(f"  {key:<30} {_format_value(value)}")
+    weights, best = state["weights"], state["best_weights"]
+    print(f"  {'特徵':<18} {'weights':>10} {'best_weights':>13}")
+    for name in weights:
+        print(f"  {name:<20} {weights[name]:>10.4f} {best.get(name, float('nan')):>13.4f}")
+
+def diff(args):
+    a, b = read_model(args.a), read_model(args.b)
+    same = True
+    for key in sorted((set(a) | set(b)) - set(WEIGHT_ARRAYS)):
+        if a.get(key) != b.get(key) or args.all:
+            same &= a.get(key) == b.get(key)
+            print(f"  {key:<30} {_format_value(a.get(key)):>12} {_format_value(b.get(key)):>12}")
+    for array in WEIGHT_ARRAYS:
+        wa, wb = a[array], b[array]
+        for name in list(wa) + [n for n in wb if n not in wa]:
+            va, vb = wa.get(name), wb.get(name)
+            if va != vb or args.all:
+                same &= va == vb
+                delta = f"{vb - va:+.4f}" if va is not None and vb is not None else ""
+                print(f"  {array}.{name:<24} {_format_value(va):>12} {_format_value(vb):>12} {delta:>10}")
+    if same:
+        print("兩個模型內容相同")
+    return 0 if same else 1
+
+def convert(args):
+    fmt = args.format or ("pickle" if args.dst.endswith(".pkl") else "bin")
+    write_model(args.dst, read_model(args.src), fmt)
+    print(f"{args.src} -> {args.dst} ({fmt})")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("show", help="顯示模型內容")
+    p.add_argument("path")
+    p.set_defaults(func=show)
+    p = sub.add_parser("diff", help="比較兩個模型，有差異時結束碼為 1")
+    p.add_argument("a")
+    p.add_argument("b")
+    p.add_argument("--all", action="store_true", help="相同的欄位也列出")
+    p.set_defaults(func=diff)
+    p = sub.add_parser("convert", help="轉換格式")
+    p.add_argument("src")
+    p.add_argument("dst")
+    p.add_argument("--format", choices=("bin", "pickle"),
+                   help="輸出格式，預設依副檔名（.pkl 為 pickle，其餘為新格式）")
+    p.set_defaults(func=convert)
+    args = parser.parse_args()
+    try:
+        return args.func(args) or 0
+    except (OSError, ValueError) as e:
+        print(f"錯誤：{e}", file=sys.stderr)
+        return 2
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,7 +1,18 @@
-import pickle
+"""
+印出模型檔的內容：python show_pkl.py [模型檔]
+預設讀 mahjong_agent.bin，不存在時讀舊版 mahjong_agent.pkl。
+經過 model_format.read_model 讀取，舊版 pickle 也不會載入任何物件。
+較完整的檢視與比較請用 model_tool.py show / diff。
+"""
+import os
+import sys
 from pprint import pprint
 
-with open('mahjong_agent.pkl', 'rb') as f:
-    data = pickle.load(f)
+from model_format import read_model
 
-pprint(data)
\ No newline at end of file
+if len(sys.argv) > 1:
+    path = sys.argv[1]
+else:
+    path = 'mahjong_agent.bin' if os.path.exists('mahjong_agent.bin') else 'mahjong_agent.pkl'
+
+pprint(read_model(path))
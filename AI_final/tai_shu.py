@@ -1,679 +1,473 @@
 #!/usr/bin/env python3
+import os
+from functools import lru_cache
+import numpy as np
+from mahjong_logic import NUM_TILE_KINDS, HONOR_START, encode_counts, decode_counts, get_hu_table
 
-# 定義牌的順序
+# 定義牌的順序：代號 -> 整數編號（與 mahjong_logic 的編號相同）
+# 以下所有判斷函式都直接使用整數編號，字串只在 recognize_hu 的輸入端轉換一次
 tile_order = {
     "one": 0, "two": 1, "three": 2, "four": 3,
     "five": 4, "six": 5, "seven": 6, "eight": 7, "nine": 8,
     "e": 9, "s": 10, "w": 11, "n": 12,
     "m": 13, "b": 14, "f": 15
 }
+E, S, W, N = 9, 10, 11, 12
+M, B, F = 13, 14, 15
+WINDS = (E, S, W, N)
+DRAGONS = (M, B, F)
 
-def recursive_find(arr, remain_num):
-    """判斷剩餘牌是否可以構成合法組合（順子或刻子）"""
-    if remain_num == 0:
-        return True
-    
-    for i in range(16):
-        if arr[i] >= 3:  # 嘗試取出刻子
-            arr[i] -= 3
-            if recursive_find(arr, remain_num - 3):
-                return True
-            arr[i] += 3  # 復原
-        
-        if i <= 7 and arr[i] >= 1 and arr[i + 1] >= 1 and arr[i + 2] >= 1:  # 嘗試取出順子
-            arr[i] -= 1
-            arr[i + 1] -= 1
-            arr[i + 2] -= 1
-            if recursive_find(arr, remain_num - 3):
-                return True
-            arr[i] += 1
-            arr[i + 1] += 1
-            arr[i + 2] += 1  # 復原
-    
-    return False
-
-def divide_three(d):
-    """檢測手牌中是否能分成刻子與順子"""
-    n = len(d)
-    arr = [0] * 16
-    
-    for card in d:
-        idx = tile_order[card]
-        arr[idx] += 1
-    
-    return recursive_find(arr, n)
-
-def is_hu(d):
-    """一般胡牌邏輯，判斷是否符合胡牌條件"""
-    tmp_d = []  # 用於記錄去掉眼後的牌
-    
-    if len(d) == 2:  # 只剩兩張牌，必須是對子
-        return d[0] == d[1]
-    
-    elif len(d) == 5:
-        for i in range(4):
-            if d[i] == d[i + 1]:  # 找到可能的眼
-                tmp_d = []
-                for j in range(5):
-                    if j != i and j != (i + 1):  # 加入非眼的牌
-                        tmp_d.append(d[j])
-                if divide_three(tmp_d):
-                    return True
-        return False
-    
-    elif len(d) == 8:
-        for i in range(7):
-            if d[i] == d[i + 1]:  # 找到可能的眼
-                tmp_d = []
-                for j in range(8):
-                    if j != i and j != (i + 1):
-                        tmp_d.append(d[j])
-                if divide_three(tmp_d):
-                    return True
-        return False
-    
-    elif len(d) == 11:
-        for i in range(10):
-            if d[i] == d[i + 1]:  # 找到可能的眼
-                tmp_d = []
-                for j in range(11):
-                    if j != i and j != (i + 1):
-                        tmp_d.append(d[j])
-                if divide_three(tmp_d):
-                    return True
-        return False
-    
-    else:  # len(d) == 14
-        for i in range(13):
-            if d[i] == d[i + 1]:  # 找到可能的眼
-                tmp_d = []
-                for j in range(14):
-                    if j != i and j != (i + 1):
-                        tmp_d.append(d[j])
-                if divide_three(tmp_d):
-                    return True
-        return False
+# 面子種類，沿用引擎動作的名稱；面子以 (種類, 最小那張牌) 表示
+CHI, PENG, GANG = "chi", "peng", "gang"
+
+DECOMPOSITION_CACHE_SIZE = 1 << 14
+
+SCORE_TABLE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "score_table.bin")
+
+
+# --- 拆牌 ---
+
+def _split_sets(counts, i, allow_gang):
+    """
+    把 counts 從編號 i 起的牌全部拆成面子，逐一產生每種拆法（面子的 tuple）。
+    最小的那張牌只能當刻子（或槓）或順子的第一張：先決定它有沒有刻子/槓，
+    剩下的張數全部當順子開頭，所以同一種拆法只會出現一次。
+    """
+    while i < NUM_TILE_KINDS and counts[i] == 0:
+        i += 1
+    if i == NUM_TILE_KINDS:
+        yield ()
+        return
+
+    c = counts[i]
+    options = [(None, c)]
+    if c >= 3:
+        options.append((PENG, c - 3))
+    if allow_gang and c == 4:
+        options.append((GANG, 0))
+
+    for kind, chis in options:
+        if chis and not (i <= 6 and counts[i+1] >= chis and counts[i+2] >= chis):
+            continue
+        head = ((kind, i),) if kind else ()
+        head += ((CHI, i),) * chis
+        counts[i] = 0
+        if chis:
+            counts[i+1] -= chis; counts[i+2] -= chis
+        for rest in _split_sets(counts, i + 1, allow_gang):
+            yield head + rest
+        counts[i] = c
+        if chis:
+            counts[i+1] += chis; counts[i+2] += chis
+
+@lru_cache(maxsize=DECOMPOSITION_CACHE_SIZE)
+def _concealed_decompositions(key):
+    """手牌（壓縮 key）所有「一對眼 + 面子」的拆法，回傳 ((眼, 面子們), ...)。"""
+    counts = decode_counts(key)
+    if sum(counts) % 3 != 2:
+        return ()
+    result = []
+    for pair in range(NUM_TILE_KINDS):
+        if counts[pair] >= 2:
+            counts[pair] -= 2
+            result.extend((pair, sets) for sets in _split_sets(counts, 0, allow_gang=False))
+            counts[pair] += 2
+    return tuple(result)
+
+def decomposition_cache_info():
+    """手牌拆法快取的 (hits, misses, maxsize, currsize)。"""
+    return _concealed_decompositions.cache_info()
+
+def _is_seven_pairs(counts):
+    """七對子：七種牌各剛好兩張。"""
+    return sum(1 for c in counts if c == 2) == 7
 
 
+class Decomposition:
+    """
+    一種胡牌拆法：眼、手中的暗面子、副露的面子，加上整手牌（含副露）的張數。
+    七對子的 pair 為 None、面子為空、pairs 為七種對子。
+    所有牌型判斷都只讀這個結構，不再各自重新數牌。
+    """
+    __slots__ = ("pair", "pairs", "concealed_sets", "exposed_sets", "counts", "triplets")
+
+    def __init__(self, pair, concealed_sets, exposed_sets, counts, pairs=()):
+        self.pair = pair
+        self.pairs = pairs
+        self.concealed_sets = concealed_sets
+        self.exposed_sets = exposed_sets
+        self.counts = counts
+        # 有刻子或槓的牌
+        self.triplets = {t for kind, t in concealed_sets + exposed_sets if kind != CHI}
+
+    @property
+    def sets(self):
+        return self.concealed_sets + self.exposed_sets
+
+    @property
+    def is_seven_pairs(self):
+        return self.pair is None
+
+def meld_to_set(meld):
+    """副露（整數編號 list，如 [3, 3, 3] 或 [0, 1, 2]）轉成 (種類, 最小那張牌)。"""
+    low = min(meld)
+    if len(meld) == 4:
+        return (GANG, low)
+    if meld[0] == meld[1] == meld[2]:
+        return (PENG, low)
+    return (CHI, low)
+
+def set_tiles(meld_set):
+    """(種類, 牌) 轉回整數編號 list。"""
+    kind, t = meld_set
+    if kind == CHI:
+        return [t, t + 1, t + 2]
+    return [t] * (4 if kind == GANG else 3)
+
+def decompose(concealed_counts, exposed_sets=()):
+    """
+    手牌張數（16 格）加上副露面子 ((種類, 牌), ...) 所有可能的胡牌拆法。
+    手牌拆一次（依壓縮 key 快取）；沒有胡牌時回傳空 list。
+    """
+    counts = list(concealed_counts)
+    exposed_sets = tuple(exposed_sets)
+    total = counts[:]
+    for meld_set in exposed_sets:
+        for t in set_tiles(meld_set):
+            total[t] += 1
+
+    result = [Decomposition(pair, sets, exposed_sets, total)
+              for pair, sets in _concealed_decompositions(encode_counts(counts))]
+    if not exposed_sets and _is_seven_pairs(counts):
+        pairs = tuple(t for t in range(NUM_TILE_KINDS) if counts[t] == 2)
+        result.append(Decomposition(None, (), (), total, pairs))
+    return result
+
+
+# --- 牌型判斷：每個函式接收一種拆法 d ---
+
 #大四喜
-def big_four_happy(card_in_hand, exposed_card):
+def big_four_happy(d):
     """大四喜：東、南、西、北四風刻"""
-    e_cnt, w_cnt, n_cnt, s_cnt = 0, 0, 0, 0
-    
-    for card in card_in_hand:
-        if card == "e": e_cnt += 1
-        elif card == "n": n_cnt += 1
-        elif card == "s": s_cnt += 1
-        elif card == "w": w_cnt += 1
-    
-    for card in exposed_card:
-        if card == "e": e_cnt += 1
-        elif card == "n": n_cnt += 1
-        elif card == "s": s_cnt += 1
-        elif card == "w": w_cnt += 1
-    
-    return e_cnt == 3 and s_cnt == 3 and w_cnt == 3 and n_cnt == 3
+    return all(t in d.triplets for t in WINDS)
 
 #小四喜
-def small_four_happy(card_in_hand, exposed_card):
+def small_four_happy(d):
     """小四喜：三風刻加一風雀頭"""
-    e_cnt, w_cnt, n_cnt, s_cnt = 0, 0, 0, 0
-    
-    for card in card_in_hand:
-        if card == "e": e_cnt += 1
-        elif card == "n": n_cnt += 1
-        elif card == "s": s_cnt += 1
-        elif card == "w": w_cnt += 1
-    
-    for card in exposed_card:
-        if card == "e": e_cnt += 1
-        elif card == "n": n_cnt += 1
-        elif card == "s": s_cnt += 1
-        elif card == "w": w_cnt += 1
-    
-    return (e_cnt == 3 and s_cnt == 3 and w_cnt == 3 and n_cnt == 2) or \
-           (e_cnt == 3 and s_cnt == 3 and w_cnt == 2 and n_cnt == 3) or \
-           (e_cnt == 3 and s_cnt == 2 and w_cnt == 3 and n_cnt == 3) or \
-           (e_cnt == 2 and s_cnt == 3 and w_cnt == 3 and n_cnt == 3)
+    return d.pair in WINDS and sum(1 for t in WINDS if t in d.triplets) == 3
 
 #大三元
-def big_three_happy(card_in_hand, exposed_card):
+def big_three_happy(d):
     """大三元：中、發、白三副刻子"""
-    m_cnt, b_cnt, f_cnt = 0, 0, 0
-    
-    for card in card_in_hand:
-        if card == "m": m_cnt += 1
-        elif card == "b": b_cnt += 1
-        elif card == "f": f_cnt += 1
-    
-    for card in exposed_card:
-        if card == "m": m_cnt += 1
-        elif card == "b": b_cnt += 1
-        elif card == "f": f_cnt += 1
-    
-    return m_cnt == 3 and b_cnt == 3 and f_cnt == 3
+    return all(t in d.triplets for t in DRAGONS)
 
 #小三元
-def small_three_happy(card_in_hand, exposed_card):
+def small_three_happy(d):
     """小三元：兩副箭刻一組箭對"""
-    m_cnt, b_cnt, f_cnt = 0, 0, 0
-    
-    for card in card_in_hand:
-        if card == "m": m_cnt += 1
-        elif card == "b": b_cnt += 1
-        elif card == "f": f_cnt += 1
-    
-    for card in exposed_card:
-        if card == "m": m_cnt += 1
-        elif card == "b": b_cnt += 1
-        elif card == "f": f_cnt += 1
-    
-    return (m_cnt == 3 and b_cnt == 3 and f_cnt == 2) or \
-           (m_cnt == 3 and b_cnt == 2 and f_cnt == 3) or \
-           (m_cnt == 2 and b_cnt == 3 and f_cnt == 3)
+    return d.pair in DRAGONS and sum(1 for t in DRAGONS if t in d.triplets) == 2
 
 #清一色
-def clear_one_color(card_in_hand, exposed_card):
-    """
-    檢查手牌加副露牌後是否只包含萬子（1-9萬），
-    不含任何字牌（東南西北中發白）。
-
-    :param card_in_hand: 玩家手牌（如 ['1萬','3萬',…]）
-    :param exposed_card: 副露或棄牌區牌（同樣格式）
-    :return: 若 9..15 號索引 (字牌) 全部計數為 0，回傳 True，否則 False。
-    """
-    # 建立長度 16 的計數陣列
-    counts = [0] * 16
-
-    # 計算手牌與副露牌
-    for tile in card_in_hand + exposed_card:
-        idx = tile_order.get(tile)
-        if idx is None:
-            raise ValueError(f"未知的牌面：{tile}")
-        counts[idx] += 1
-
-    # 索引 0..8 是萬子，9..15 是字牌
-    # 只要有任何字牌出現，回傳 False
-    for i in range(9, 16):
-        if counts[i] > 0:
-            return False
-
-    return True
+def clear_one_color(d):
+    """手牌加副露只有萬子，不含任何字牌（東南西北中發白）"""
+    return not any(d.counts[HONOR_START:])
 
 #字一色
-def clear_no_color(card_in_hand, exposed_card):
-    """
-        邏輯和清一色一樣 換成沒有大字這樣
-    """
-    # 建立長度 16 的計數陣列
-    counts = [0] * 16
-
-    # 計算手牌與副露牌
-    for tile in card_in_hand + exposed_card:
-        idx = tile_order.get(tile)
-        if idx is None:
-            raise ValueError(f"未知的牌面：{tile}")
-        counts[idx] += 1
-
-    # 索引 0..8 是萬子，9..15 是字牌
-    # 只要有任何萬字出現，回傳 False
-    for i in range(0, 8):
-        if counts[i] > 0:
-            return False
-
-    return True
+def clear_no_color(d):
+    """邏輯和清一色一樣 換成只有大字、沒有萬子"""
+    return not any(d.counts[:HONOR_START])
 
 #平胡
-def find_pin_hu(arr, n):
-    if n == 0:
-        return True
-    
-    for i in range(16):
-        if i <= 7 and arr[i] >= 1 and arr[i + 1] >= 1 and arr[i + 2] >= 1:  # 嘗試取出順子
-            arr[i] -= 1
-            arr[i + 1] -= 1
-            arr[i + 2] -= 1
-            if find_pin_hu(arr, n - 3): return True
-            arr[i] += 1
-            arr[i + 1] += 1
-            arr[i + 2] += 1  # 復原
-    return False
-    
-def pin_hu(card_in_hand, exposed_card): # 平胡邏輯
-    
-    tmp_d = []  # 用於記錄去掉眼後的牌
-    arr = [0] * 16
-    
-    if len(card_in_hand) == 2:  # 只剩兩張牌，必須是對子
-        arr = [0] * 16
-        
-        for card in exposed_card:
-            idx = tile_order[card]
-            arr[idx] += 1
-        if find_pin_hu(arr, len(exposed_card)) : return True
-    
-    elif len(card_in_hand) == 5:
-        for i in range(4):
-            if card_in_hand[i] == card_in_hand[i + 1]:  # 找到可能的眼
-                tmp_d = []
-                for j in range(5):
-                    if j != i and j != (i + 1):  # 加入非眼的牌
-                        tmp_d.append(card_in_hand[j])
-                for card in exposed_card:
-                    idx = tile_order[card]
-                    arr[idx] += 1
-                for card in tmp_d:
-                    idx = tile_order[card]
-                    arr[idx] += 1
-                if find_pin_hu(arr, len(tmp_d + exposed_card)) : return True
-        return False
-    
-    elif len(card_in_hand) == 8:
-        for i in range(7):
-            if card_in_hand[i] == card_in_hand[i + 1]:  # 找到可能的眼
-                tmp_d = []
-                for j in range(8):
-                    if j != i and j != (i + 1):
-                        tmp_d.append(card_in_hand[j])
-                for card in exposed_card:
-                    idx = tile_order[card]
-                    arr[idx] += 1
-                for card in tmp_d:
-                    idx = tile_order[card]
-                    arr[idx] += 1
-                if find_pin_hu(arr, len(tmp_d + exposed_card)) : return True  # 去除眼睛後 判斷平胡
-        return False
-    
-    elif len(card_in_hand) == 11:
-        for i in range(10):
-            if card_in_hand[i] == card_in_hand[i + 1]:  # 找到可能的眼
-                tmp_d = []
-                for j in range(11):
-                    if j != i and j != (i + 1):
-                        tmp_d.append(card_in_hand[j])
-                for card in exposed_card:
-                    idx = tile_order[card]
-                    arr[idx] += 1
-                for card in tmp_d:
-                    idx = tile_order[card]
-                    arr[idx] += 1
-                if find_pin_hu(arr, len(tmp_d + exposed_card)) : return True  # 去除眼睛後 判斷平胡
-        return False
-    
-    else:  # len(d) == 14
-        for i in range(13):
-            if card_in_hand[i] == card_in_hand[i + 1]:  # 找到可能的眼
-                tmp_d = []
-                for j in range(14):
-                    if j != i and j != (i + 1):
-                        tmp_d.append(card_in_hand[j])
-                for card in exposed_card:
-                    idx = tile_order[card]
-                    arr[idx] += 1
-                for card in tmp_d:
-                    idx = tile_order[card]
-                    arr[idx] += 1
-                if find_pin_hu(arr, len(tmp_d + exposed_card)) : return True  # 去除眼睛後 判斷平胡
-        return False
+def pin_hu(d):
+    """平胡：面子全是順子"""
+    return not d.is_seven_pairs and all(kind == CHI for kind, _ in d.sets)
 
 #碰碰胡
-def find_pon_pon_hu(arr, n):
-    if n == 0:
-        return True
-    for i in range(16):
-        if arr[i] >= 3:  # 嘗試取出刻子
-            arr[i] -= 3
-            if recursive_find(arr, n - 3):
-                return True
-            arr[i] += 3  # 復原
-    
-    return False
-
-def pon_pon_hu(card_in_hand, exposed_card):
-    tmp_d = []  # 用於記錄去掉眼後的牌
-    arr = [0] * 16
-    
-    if len(card_in_hand) == 2:  # 只剩兩張牌，必須是對子
-        arr = [0] * 16
-        
-        for card in exposed_card:
-            idx = tile_order[card]
-            arr[idx] += 1
-        if find_pon_pon_hu(arr, len(exposed_card)) : return True
-    
-    elif len(card_in_hand) == 5:
-        for i in range(4):
-            if card_in_hand[i] == card_in_hand[i + 1]:  # 找到可能的眼
-                tmp_d = []
-                for j in range(5):
-                    if j != i and j != (i + 1):  # 加入非眼的牌
-                        tmp_d.append(card_in_hand[j])
-                for card in exposed_card:
-                    idx = tile_order[card]
-                    arr[idx] += 1
-                for card in tmp_d:
-                    idx = tile_order[card]
-                    arr[idx] += 1
-                if find_pon_pon_hu(arr, 3 + len(exposed_card)) : return True
-        return False
-    
-    elif len(card_in_hand) == 8:
-        for i in range(7):
-            if card_in_hand[i] == card_in_hand[i + 1]:  # 找到可能的眼
-                tmp_d = []
-                for j in range(8):
-                    if j != i and j != (i + 1):
-                        tmp_d.append(card_in_hand[j])
-                for card in exposed_card:
-                    idx = tile_order[card]
-                    arr[idx] += 1
-                for card in tmp_d:
-                    idx = tile_order[card]
-                    arr[idx] += 1
-                if find_pon_pon_hu(arr, 6 + len(exposed_card)) : return True  # 去除眼睛後 判斷平胡
-        return False
-    
-    elif len(card_in_hand) == 11:
-        for i in range(10):
-            if card_in_hand[i] == card_in_hand[i + 1]:  # 找到可能的眼
-                tmp_d = []
-                for j in range(11):
-                    if j != i and j != (i + 1):
-                        tmp_d.append(card_in_hand[j])
-                for card in exposed_card:
-                    idx = tile_order[card]
-                    arr[idx] += 1
-                for card in tmp_d:
-                    idx = tile_order[card]
-                    arr[idx] += 1
-                if find_pon_pon_hu(arr, 8 + len( exposed_card)) : return True  # 去除眼睛後 判斷平胡
-        return False
-    
-    else:  # len(d) == 14
-        for i in range(13):
-            if card_in_hand[i] == card_in_hand[i + 1]:  # 找到可能的眼
-                tmp_d = []
-                for j in range(14):
-                    if j != i and j != (i + 1):
-                        tmp_d.append(card_in_hand[j])
-                for card in exposed_card:
-                    idx = tile_order[card]
-                    arr[idx] += 1
-                for card in tmp_d:
-                    idx = tile_order[card]
-                    arr[idx] += 1
-                if find_pin_hu(arr, 11 + len(exposed_card)) : return True  # 去除眼睛後 判斷平胡
-        return False
+def pon_pon_hu(d):
+    """碰碰胡：面子全是刻子或槓"""
+    return not d.is_seven_pairs and all(kind != CHI for kind, _ in d.sets)
 
+def _dark_triplets(d):
+    """手中的暗刻數 (暗槓算在副露裡，到時候再說)"""
+    return sum(1 for kind, _ in d.concealed_sets if kind == PENG)
 
 #四暗刻
-def four_dark(card_in_hand, exposed_card):
-    '''
-    邏輯：四*3+一*2 
-    
-    (自摸 跟 胡牌判斷到時候再說)
-    (暗槓 跟 明槓 也到時候再說)
-    '''
-    arr = [0] * 16
-    for card in card_in_hand:
-        idx = tile_order[card]
-        arr[idx] += 1
-    
-    connectThree = 0
-    for i in range(16):
-        if arr[i] == 3:
-            connectThree = connectThree + 1
-    
-    if connectThree == 4:
-        return True
-    else:
-        return False
+def four_dark(d):
+    return _dark_triplets(d) == 4
 
 #三暗刻
-def three_dark(card_in_hand, exposed_card):
+def three_dark(d):
+    return _dark_triplets(d) == 3
+
+#九聯保燈
+def damnnnn(d):
     '''
-    邏輯：四*3+一*2 
-    
-    (自摸 跟 胡牌判斷到時候再說)
-    (暗槓 跟 明槓 也到時候再說)
+        111 2345678 999 再加任一張萬子，門清
+        手牌扣掉 [3,1,1,1,1,1,1,1,3] 之後要剛好剩一張萬子
     '''
-    arr = [0] * 16
-    for card in card_in_hand:
-        idx = tile_order[card]
-        arr[idx] += 1
-    
-    connectThree = 0
-    for i in range(16):
-        if arr[i] == 3:
-            connectThree = connectThree + 1
-    
-    if connectThree == 3:
-        return True
-    else:
+    if d.exposed_sets or d.is_seven_pairs or not clear_one_color(d):
         return False
+    base = (3, 1, 1, 1, 1, 1, 1, 1, 3)
+    return all(c >= b for c, b in zip(d.counts, base))
+
+#四槓子
+def four_gong(d):
+    return sum(1 for kind, _ in d.exposed_sets if kind == GANG) == 4
 
 #七對子
-def seven_pairs(card_in_hand):
-    #判斷7*2
-    arr = [0] * 16
-    for card in card_in_hand:
-        idx = tile_order[card]
-        arr[idx] += 1
-        
-    connectThree = 0
-    for i in range(16):
-        if arr[i] == 2:
-            connectThree = connectThree + 1
-    
-    if connectThree == 7:
-        return True
-    else:
-        return False
+def seven_pairs(d):
+    return d.is_seven_pairs
 
 #連七
-def consecutive_seven(card_in_hand):
-    #判斷7*2, 想法是(0, 8), 然後紀錄連續多少個
-    
-    #setup
-    arr = [0] * 16
-    for card in card_in_hand:
-        idx = tile_order[card]
-        arr[idx] += 1
-    
-    #implement    
-    now = 0
-    for i in range(16):
-        if now == 7:
-            return True
-        
-        if arr[i] == 2:
-            now = now + 1
-        else:
-            now = 0
-    
-    return False
+def consecutive_seven(d):
+    """七對子且七對是連續的萬子"""
+    return d.is_seven_pairs and d.pairs[6] - d.pairs[0] == 6 and d.pairs[6] < HONOR_START
 
 #北斗七星
-def weird_seven(card_in_hand):
-    #判斷7*2, 從東開始, 沒有就直接結束
-    arr = [0] * 16
-    for card in card_in_hand:
-        idx = tile_order[card]
-        arr[idx] += 1
-        
-    
-    for i in range(9, 16, 1):
-        if arr[i] != 2:
-            return False
-    
-    return True
-
-#九聯保燈
-def damnnnn(card_in_hand): 
-    '''
-        111 2345678 999 (可以胡9張)
-        
-        判斷是想說 
-        1. ([1, 9]全三 + 2~8只能有一個是二，其他全一)
-        2. ([1, 9]其中一個4另一個3 + 2~8全一)
-        
-        case 1是如果2~8有兩個非一就return
-        case 2是如果有非一就return
-    '''
-    arr = [0] * 16
-    for card in card_in_hand:
-        idx = tile_order[card]
-        arr[idx] += 1
-
-    #CASE 1
-    if arr[0] == 3 and arr[8] == 3:
-        non_one = 0
-        for i in range(1, 8, 1):
-            if arr[i] != 1:
-                non_one += 1
-        if non_one > 1:
-            return False
-
-        return True
-    elif (arr[0] == 4 and arr[8] == 3) or (arr[0] == 3 and arr[8] == 4):
-        for i in range(1, 8, 1):
-            if arr[i] != 1:
-                return False
-        
-        return True
-    else:
+def weird_seven(d):
+    """七對子且七對全是字牌"""
+    return d.is_seven_pairs and d.pairs[0] >= HONOR_START
+
+
+# (名稱, 台數, 判斷)；名稱為 None 的只加台數不列出
+YAKU_RULES = [
+    ("九聯保燈", 88, damnnnn),
+    ("four_gong", 88, four_gong),
+    ("big_four_happy", 88, big_four_happy),
+    ("small_four_happy", 64, small_four_happy),
+    ("big_three_happy", 88, big_three_happy),
+    ("small_three_happy", 64, small_three_happy),
+    ("clear_one_color", 80, clear_one_color),
+    ("clear_one_color", 320, clear_no_color),   # 字一色
+    (None, 10, pin_hu),
+    (None, 40, pon_pon_hu),
+    ("four_dark", 160, four_dark),
+    ("three_dark", 40, three_dark),
+]
+
+# 七對子只看這幾條，連七與北斗七星取代一般七對子
+SEVEN_PAIRS_RULES = [
+    ("consecutive_seven", 88, consecutive_seven),
+    ("weird_seven", 88, weird_seven),
+    ("seven_pairs", 40, seven_pairs),
+]
+
+# 牌型 bitmask 的第 i 位對應 ALL_RULES[i]
+ALL_RULES = YAKU_RULES + SEVEN_PAIRS_RULES
+
+def yaku_mask(d):
+    """對一種拆法套用所有牌型，回傳成立牌型的 bitmask。"""
+    mask = 0
+    if d.is_seven_pairs:
+        for i, (name, tai, rule) in enumerate(SEVEN_PAIRS_RULES, len(YAKU_RULES)):
+            if rule(d):
+                return 1 << i
+    for i, (name, tai, rule) in enumerate(YAKU_RULES):
+        if rule(d):
+            mask |= 1 << i
+    return mask
+
+@lru_cache(maxsize=None)
+def _mask_to_score(mask):
+    result = []
+    tai_shu = 0
+    for i, (name, tai, rule) in enumerate(ALL_RULES):
+        if mask >> i & 1:
+            if name:
+                result.append(name)
+            tai_shu += tai
+    if result == []:
+        result.append("pi hu") # 屁胡
+    return tuple(result), tai_shu
+
+def mask_to_score(mask):
+    """bitmask 轉成 (牌型列表, 台數)，不含情境加台。牌型組合不多，結果快取。"""
+    result, tai_shu = _mask_to_score(mask)
+    return list(result), tai_shu
+
+def score_decomposition(d):
+    """對一種拆法套用所有牌型，回傳 (牌型列表, 台數)。"""
+    return mask_to_score(yaku_mask(d))
+
+def best_decomposition(concealed_counts, exposed_sets=()):
+    """所有拆法中台數最高的一種，回傳 (拆法, bitmask, 台數)；沒有胡牌回傳 None。"""
+    best = None
+    for d in decompose(concealed_counts, exposed_sets):
+        mask = yaku_mask(d)
+        tai = mask_to_score(mask)[1]
+        if best is None or tai > best[2]:
+            best = (d, mask, tai)
+    return best
+
+
+# --- 門清胡牌計分表 ---
+# 檔案格式：16 bytes 檔頭 (SCORE_TABLE_MAGIC, 版本, 筆數)，
+# 接著依序是排序後的 key (uint64 × n)、牌型 bitmask (uint16 × n)、台數 (uint16 × n)。
+# 執行時以 np.memmap 唯讀映射，多個行程共用同一份分頁。
+
+SCORE_TABLE_MAGIC = b"TSTB"
+SCORE_TABLE_VERSION = 1   # 牌型規則或台數改變時要加一，舊檔會被忽略
+_HEADER = np.dtype([("magic", "S4"), ("version", "<u4"), ("size", "<u8")])
+
+_score_table = None   # None：還沒載入；False：沒有可用的表
+
+def build_score_table(path=SCORE_TABLE_PATH):
+    """
+    離線建表：對每一手門清胡牌（4 面子 1 眼，以及七對子）跑一次牌型判斷，
+    把 bitmask 與台數寫進 path，回傳筆數。
+    """
+    keys = {key for key, sets in get_hu_table().items() if sets == 4}
+    pair_kinds = [0] * NUM_TILE_KINDS
+
+    def add_seven_pairs(first, left):
+        if left == 0:
+            keys.add(encode_counts(pair_kinds))
+            return
+        for t in range(first, NUM_TILE_KINDS - left + 1):
+            pair_kinds[t] = 2
+            add_seven_pairs(t + 1, left - 1)
+            pair_kinds[t] = 0
+
+    add_seven_pairs(0, 7)
+
+    keys = np.array(sorted(keys), dtype="<u8")
+    masks = np.empty(len(keys), dtype="<u2")
+    tais = np.empty(len(keys), dtype="<u2")
+    for i, key in enumerate(keys.tolist()):
+        d, masks[i], tais[i] = best_decomposition(decode_counts(key))
+
+    header = np.array([(SCORE_TABLE_MAGIC, SCORE_TABLE_VERSION, len(keys))], dtype=_HEADER)
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        for part in (header, keys, masks, tais):
+            f.write(part.tobytes())
+    os.replace(tmp, path)
+    load_score_table(path)
+    return len(keys)
+
+def load_score_table(path=SCORE_TABLE_PATH):
+    """
+    以 np.memmap 映射計分表，回傳 (keys, masks, tais)。
+    檔案不存在或版本不符時回傳 None，計分改走拆牌（不在啟動時建表）。
+    """
+    global _score_table
+    _score_table = False
+    if not os.path.exists(path) or os.path.getsize(path) < _HEADER.itemsize:
+        return None
+    data = np.memmap(path, dtype=np.uint8, mode="r")
+    header = data[:_HEADER.itemsize].view(_HEADER)[0]
+    n = int(header["size"])
+    if header["magic"] != SCORE_TABLE_MAGIC or header["version"] != SCORE_TABLE_VERSION \
+            or len(data) != _HEADER.itemsize + 12 * n:
+        return None
+    start = _HEADER.itemsize
+    data = data.view(np.ndarray)  # 仍然是映射的分頁，只是少掉 memmap 子類別的額外負擔
+    keys = data[start:start + 8 * n].view("<u8")
+    masks = data[start + 8 * n:start + 10 * n].view("<u2")
+    tais = data[start + 10 * n:].view("<u2")
+    _score_table = (keys, masks, tais)
+    return _score_table
+
+def _lookup_score(key):
+    """查門清計分表，回傳 (bitmask, 台數)；不是胡牌回傳 None，沒有表回傳 False。"""
+    if _score_table is None:
+        load_score_table()
+    if not _score_table:
         return False
+    keys, masks, tais = _score_table
+    i = int(keys.searchsorted(np.uint64(key)))
+    if i == len(keys) or keys[i] != key:
+        return None
+    return int(masks[i]), int(tais[i])
 
-
-#四槓子
-def four_gong(card_in_hand, exposed_card):
-    '''
-        看 槓牌有沒有四個槓就好 反正手牌已經確定胡牌了
-    '''
-    
-    arr = [0] * 16
-    for card in exposed_card:
-        idx = tile_order[card]
-        arr[idx] += 1    
-    
-    connectFour = 0
-    for i in range(16):
-        if arr[i] == 4:
-            connectFour += 1
-    
-    if connectFour == 4:
-        return True
-    
-    return False
+class ScoreResult:
+    """
+    score_hand 的結果。
+    yaku：牌型名稱列表；tai：總台數（含自摸、天地胡、海底等加台）；
+    bonus：其中情境加台的部分；decomposition：計分所用的拆法
+    （沒胡或由計分表查到時為 None）。
+    可以直接拆成 (牌型列表, 台數)，與 recognize_hu 的回傳格式相同。
+    """
+    __slots__ = ("yaku", "tai", "bonus", "decomposition")
+
+    def __init__(self, yaku, tai, bonus=0, decomposition=None):
+        self.yaku = yaku
+        self.tai = tai
+        self.bonus = bonus
+        self.decomposition = decomposition
+
+    @property
+    def is_win(self):
+        return bool(self.yaku)
+
+    def __iter__(self):
+        return iter((self.yaku, self.tai))
+
+    def __repr__(self):
+        return f"ScoreResult({self.yaku}, {self.tai})"
+
+def situational_bonus(is_self_drawn, wall_remaining):
+    """和拆法無關的加台：自摸、天地胡、海底。wall_remaining 為 None 時不計牌山。"""
+    tai_shu = 0
+    if is_self_drawn:
+        tai_shu += 1 #自摸判斷
+    if wall_remaining == 37 or wall_remaining == 36:
+        tai_shu += 160 #天湖, 地胡
+    if wall_remaining == 0:
+        tai_shu += 10 #海底撈月
+    if wall_remaining == 0:
+        tai_shu += 10  # 底台數為10
+    return tai_shu
+
+def _score_sets(concealed_counts, exposed_sets, is_self_drawn, wall_remaining, key=None):
+    bonus = situational_bonus(is_self_drawn, wall_remaining)
+
+    # 門清 14 張直接查表，只剩情境加台要算
+    if not exposed_sets and sum(concealed_counts) == 14:
+        found = _lookup_score(encode_counts(concealed_counts) if key is None else key)
+        if found is None:
+            return ScoreResult([], 0)  # 沒有胡牌，台數為0
+        if found:
+            result, tai_shu = mask_to_score(found[0])
+            return ScoreResult(result, found[1] + bonus, bonus)
+
+    # 拆牌只做一次，所有牌型共用；有多種拆法時取台數最高的
+    best = best_decomposition(concealed_counts, exposed_sets)
+    if best is None:
+        return ScoreResult([], 0)  # 沒有胡牌，台數為0
+    d, mask, tai_shu = best
+    return ScoreResult(mask_to_score(mask)[0], tai_shu + bonus, bonus, d)
+
+def score_hand(concealed_counts, melds=(), is_self_drawn=False, wall_remaining=None):
+    """
+    計算一手胡牌的牌型與台數，回傳 ScoreResult。
+    concealed_counts：手牌 16 格張數（list/tuple），或 mahjong_logic.Hand
+    melds：副露，每組為整數編號 list（與 GameState.melds 相同格式）
+    不經過字串，可以在 agent 搜尋中直接呼叫。
+    """
+    counts = getattr(concealed_counts, "counts", concealed_counts)
+    key = getattr(concealed_counts, "key", None)
+    return _score_sets(counts, tuple(meld_to_set(m) for m in melds), is_self_drawn, wall_remaining, key)
 
 #判斷胡牌
 def recognize_hu(s1, s2, is_self, deck_length):
-    """識別胡牌類型並計算台數"""
-    
-    '''variables: 吃碰槓的牌 + 手牌 + 是否自摸 (台數，可以拿來判斷暗刻) + 剩餘牌數 (判斷天地胡等)'''
-    # 處理暴露的牌（吃/碰/槓）
-    exposed_card = s1.split(";") if s1 else []
-    # 處理手牌
-    card_in_hand = s2.split(",") if s2 else []
-    
-    # 按照自定義順序排序
-    exposed_card.sort(key=lambda x: tile_order.get(x, float('inf')))
-    card_in_hand.sort(key=lambda x: tile_order.get(x, float('inf')))
-    
-    result = []
-    tai_shu = 0  # 台數累積
-    
-    if is_hu(card_in_hand):
-        if is_self:
-            tai_shu += 1 #自摸判斷
-        if deck_length == 37 or deck_length == 36:
-            tai_shu += 160 #天湖, 地胡
-        if deck_length == 0:
-            tai_shu += 10 #海底撈月
-        if deck_length == 0:
-            tai_shu += 10  # 底台數為10
-        
-        
-        #九連
-        if damnnnn(card_in_hand):
-            result.append("九聯保燈")
-            tai_shu += 88
-        
-        #四槓
-        if four_gong(card_in_hand, exposed_card):
-            result.append("four_gong")
-            tai_shu += 88
-        
-        #大四
-        if big_four_happy(card_in_hand, exposed_card):
-            result.append("big_four_happy")
-            tai_shu += 88
-        
-        
-        #小四
-        if small_four_happy(card_in_hand, exposed_card):
-            result.append("small_four_happy")
-            tai_shu += 64
-        
-        
-        #大三
-        if big_three_happy(card_in_hand, exposed_card):
-            result.append("big_three_happy")
-            tai_shu += 88
-        
-        
-        #小三
-        if small_three_happy(card_in_hand, exposed_card):
-            result.append("small_three_happy")
-            tai_shu += 64
-        
-        #清一
-        if clear_one_color(card_in_hand, exposed_card):
-            result.append("clear_one_color")
-            tai_shu += 80
- 
-        #字一
-        if clear_no_color(card_in_hand, exposed_card):
-            result.append("clear_one_color")
-            tai_shu += 320
-        
-        #平胡
-        if pin_hu(card_in_hand, exposed_card):
-            # result.append("pin hu")
-            tai_shu += 10
-            
-        #碰碰
-        if pon_pon_hu(card_in_hand, exposed_card):
-            # result.append("pon_pon_hu")
-            tai_shu += 40
-         
-        #四暗刻
-        if four_dark(card_in_hand, exposed_card):
-            result.append("four_dark")
-            tai_shu += 160   
-        
-        
-        #三暗刻
-        if three_dark(card_in_hand, exposed_card):
-            result.append("three_dark")
-            tai_shu += 40     
-        
-        if result == []:
-            result.append("pi hu") # 屁胡
-        return result, tai_shu
-    elif seven_pairs(card_in_hand):
-        if consecutive_seven(card_in_hand):
-            result.append("consecutive_seven")
-            tai_shu += 88
-        elif weird_seven(card_in_hand):
-            result.append("weird_seven")
-            tai_shu += 88
-        else:
-            result.append("seven_pairs")
-            tai_shu += 40
-        return result, tai_shu
-    else:
-        return [], 0  # 沒有胡牌，台數為0
+    """
+    識別胡牌類型並計算台數（字串介面，保留相容用）
+    s1：吃碰槓的牌，以 ";" 分隔；s2：手牌，以 "," 分隔；回傳 (牌型列表, 台數)
+    """
+    counts = [0] * NUM_TILE_KINDS
+    for x in s2.split(",") if s2 else ():
+        counts[tile_order[x]] += 1
+    exposed_counts = [0] * NUM_TILE_KINDS
+    for x in s1.split(";") if s1 else ():
+        exposed_counts[tile_order[x]] += 1
+
+    # 字串沒有分組，副露的每種拆法都試，取台數最高的
+    best = ScoreResult([], 0)
+    for exposed_sets in _split_sets(exposed_counts, 0, allow_gang=True):
+        scored = _score_sets(counts, exposed_sets, is_self, deck_length)
+        if scored.is_win and (not best.is_win or scored.tai > best.tai):
+            best = scored
+    return best.yaku, best.tai
 
 
 
@@ -691,4 +485,4 @@ def main():
     # print(result, tai_shu)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,377 @@
+"""agent：評估與打牌排序要與參考版本一致；決策、權重評估、存檔與共用 agent 的行為。"""
+import os
+import random
+
+import pytest
+
+import agent as agent_module
+from agent import (
+    DEFAULT_WEIGHTS, FEATURE_NAMES, MODEL_PATHS, MahjongAgent, ModelWriter, get_agent,
+    hand_features, is_waiting,
+)
+from mahjong_logic import HONOR_START, NUM_TILE_KINDS, Hand
+import model_format
+from model_format import read_model, write_model
+
+DECK = [t for t in range(NUM_TILE_KINDS) for _ in range(4)]
+
+
+def reference_evaluate(weights, hand):
+    """原本逐張加權重的 evaluate_hand（改成特徵表之前的寫法）。"""
+    if not hand:
+        return -10.0
+    w, counts = weights, hand.counts
+    value = 0.0
+    for tile, count in enumerate(counts):
+        if count == 2:
+            value += w['honor_pair'] if tile >= HONOR_START else w['pair']
+        elif count == 3:
+            value += w['honor_triple'] if tile >= HONOR_START else w['triple']
+        elif count == 1:
+            value += w['single']
+    for i in range(7):
+        present = (counts[i] > 0) + (counts[i+1] > 0) + (counts[i+2] > 0)
+        value += {3: w['sequence'], 2: w['one_away'], 1: w['two_away']}.get(present, 0.0)
+    numbers = [0] * 11
+    for tile in hand:
+        if tile >= HONOR_START:
+            value += w['honor'] + w['safe_tile']
+            continue
+        num = tile + 1
+        if num in (1, 9):
+            value += w['terminal'] + w['safe_tile']
+        elif num in (4, 5, 6):
+            value += w['middle'] + w['risky_tile']
+        elif num in (3, 7):
+            value += w['near_middle']
+        numbers[num] += 1
+        value += w['flexible'] if numbers[num-1] > 0 or numbers[num+1] > 0 else w['isolated']
+    if is_waiting(hand):
+        value += w['almost_ready']
+        honor = counts[HONOR_START:]
+        if sum(1 for n in honor if n >= 2) >= 2 or not any(honor):
+            value += w['ready_high_score']
+    return value
+
+def _random_hand(rng, size):
+    return Hand(rng.sample(DECK, size))
+
+def _random_weights(rng):
+    return {name: rng.uniform(-5, 5) for name in FEATURE_NAMES}
+
+@pytest.fixture
+def agent():
+    return MahjongAgent("player", weights=DEFAULT_WEIGHTS)
+
+
+# --- 特徵評估 ---
+
+def test_evaluate_hand_matches_reference(agent):
+    rng = random.Random(0)
+    for weights in [DEFAULT_WEIGHTS] + [_random_weights(rng) for _ in range(5)]:
+        agent.weights = weights
+        for _ in range(500):
+            hand = _random_hand(rng, rng.choice([1, 5, 13, 13, 14, 17]))
+            assert agent.evaluate_hand(hand) == pytest.approx(reference_evaluate(weights, hand), abs=1e-9)
+
+def test_waiting_features():
+    hand = Hand([0, 0, 0, 1, 2, 3, 4, 5, 6, 7, 8, 8, 8])  # 清一色聽牌
+    f = dict(zip(FEATURE_NAMES, hand_features(hand.counts)))
+    assert f['almost_ready'] == 1 and f['ready_high_score'] == 1
+    assert hand_features([hand.counts]).tolist() == [[f[name] for name in FEATURE_NAMES]]
+
+def test_evaluate_hands_matches_evaluate_hand(agent):
+    rng = random.Random(1)
+    hands = [_random_hand(rng, rng.choice([13, 14])) for _ in range(300)] + [Hand()]
+    values = agent.evaluate_hands([h.counts for h in hands])
+    assert values.tolist() == [agent.evaluate_hand(h) for h in hands]
+    assert values[-1] == -10.0
+
+
+# --- 打牌排序 ---
+
+def test_rank_discards_scores_each_kind_once(agent):
+    uncached = MahjongAgent("player", eval_cache_size=0, weights=DEFAULT_WEIGHTS)
+    rng = random.Random(2)
+    for _ in range(300):
+        hand = _random_hand(rng, 14)
+        ranked = agent.rank_discards(hand)
+        assert sorted(t for t, _ in ranked) == hand.kinds()
+        for tile, value in ranked:
+            after = hand.copy()
+            after.remove(tile)
+            safe = agent.weights['safe_tile'] if tile >= HONOR_START or tile in (0, 8) else 0.0
+            assert value == uncached.evaluate_hand(after) + safe
+        # 由高到低，同分時編號小的在前
+        assert ranked == sorted(ranked, key=lambda kv: (-kv[1], kv[0]))
+
+def test_rank_discards_tie_goes_to_lowest_tile(agent):
+    # 打 9 萬、東、北的價值完全相同，要打編號最小的 9 萬
+    hand = Hand([0, 1, 1, 2, 3, 4, 4, 6, 8, 8, 9, 12, 13, 13])
+    ranked = agent.rank_discards(hand)
+    assert [t for t, _ in ranked[:3]] == [8, 9, 12]
+    assert ranked[0][1] == ranked[1][1] == ranked[2][1]
+    assert agent.choose_action(hand) == 8
+
+def test_rank_discards_skips_waiting_check_only_when_safe(agent):
+    # 打一張就聽牌的門清 14 張，聽牌特徵要算進去
+    hand = Hand([0, 0, 0, 1, 2, 3, 4, 5, 6, 7, 8, 8, 8, 15])
+    value = dict(agent.rank_discards(hand))[15]
+    after = Hand([0, 0, 0, 1, 2, 3, 4, 5, 6, 7, 8, 8, 8])
+    assert value == pytest.approx(reference_evaluate(agent.weights, after) + agent.weights['safe_tile'])
+    f = dict(zip(FEATURE_NAMES, hand_features([after.counts], check_waiting=False)[0]))
+    assert f['almost_ready'] == 0
+
+
+# --- 評估快取 ---
+
+def test_eval_cache_hits_and_misses(agent):
+    hand = Hand([0, 1, 2, 9, 9, 13])
+    value = agent.evaluate_hand(hand)
+    assert agent.eval_cache_info()[:2] == (0, 1)
+    assert agent.evaluate_hand(hand) == value
+    assert agent.eval_cache_info() == (1, 1, agent.eval_cache_size, 1)
+
+def test_eval_cache_invalidated_by_new_weights(agent):
+    hand = Hand([0, 1, 2, 9, 9, 13])
+    before = agent.evaluate_hand(hand)
+    weights = dict(agent.weights, honor_pair=agent.weights['honor_pair'] + 1)
+    agent.weights = weights
+    assert agent.eval_cache_info()[3] == 0
+    assert agent.evaluate_hand(hand) == pytest.approx(before + 1)
+
+def test_eval_cache_evicts_least_recently_used():
+    agent = MahjongAgent("player", eval_cache_size=2, weights=DEFAULT_WEIGHTS)
+    a, b, c = Hand([0]), Hand([1]), Hand([2])
+    agent.evaluate_hand(a)
+    agent.evaluate_hand(b)
+    agent.evaluate_hand(a)   # b 變成最久沒用的
+    agent.evaluate_hand(c)
+    hits = agent.eval_cache_info()[0]
+    agent.evaluate_hand(a)
+    assert agent.eval_cache_info()[0] == hits + 1
+    agent.evaluate_hand(b)
+    assert agent.eval_cache_info()[0] == hits + 1
+    assert agent.eval_cache_info()[3] == 2
+
+def test_eval_cache_disabled():
+    agent = MahjongAgent("player", eval_cache_size=0, weights=DEFAULT_WEIGHTS)
+    hand = Hand([0, 1, 2, 9, 9, 13])
+    agent.evaluate_hand(hand)
+    agent.evaluate_hand(hand)
+    assert agent.eval_cache_info() == (0, 2, 0, 0)
+
+def test_rank_discards_reuses_cache(agent):
+    rng = random.Random(3)
+    hand = _random_hand(rng, 14)
+    first = agent.rank_discards(hand)
+    hits, misses = agent.eval_cache_info()[:2]
+    assert agent.rank_discards(hand) == first
+    assert agent.eval_cache_info()[:2] == (hits + len(first), misses)
+
+
+# --- decide ---
+
+def test_decide_on_own_turn(agent):
+    rng = random.Random(4)
+    for _ in range(200):
+        hand = _random_hand(rng, 14)
+        before = hand.copy()
+        decision = agent.decide(hand)
+        assert hand == before
+        ranked = agent.rank_discards(hand)
+        assert decision.action == 'discard' and decision.discard == ranked[0][0]
+        assert list(decision.values.items()) == ranked
+    assert agent.decide(Hand([0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 9, 15, 15, 15])).action == 'hu'
+
+def test_decide_hu_counts_melds(agent):
+    hand = Hand([0, 1, 2, 3, 4, 5, 6, 7, 8, 9])
+    assert agent.decide(hand, [[13, 13, 13]], 9).action == 'hu'
+    assert agent.decide(hand, (), 9).action != 'hu'
+
+def test_decide_on_discard(agent):
+    rng = random.Random(5)
+    seen = set()
+    for _ in range(2000):
+        hand = _random_hand(rng, 13)
+        tile = rng.randrange(NUM_TILE_KINDS)
+        decision = agent.decide(hand, (), tile)
+        seen.add(decision.action)
+        values = decision.values
+        if decision.action == 'hu':
+            continue
+        options = [v for k, v in values.items() if k != 'pass']
+        if decision.action == 'pass':
+            assert all(v <= values['pass'] for v in options)
+            assert decision.discard is None
+            continue
+        if decision.action == 'gang':
+            assert values['gang'] > values['pass'] and decision.discard is None
+            continue
+        after = hand.copy()
+        if decision.action == 'peng':
+            assert values['peng'] > values['pass']
+            after.remove(tile, 2)
+        else:
+            assert decision.chi[0] <= tile <= decision.chi[2]
+            assert values[('chi', tuple(decision.chi))] > values['pass']
+            for t in decision.chi:
+                if t != tile:
+                    after.remove(t)
+        assert decision.discard == agent.rank_discards(after)[0][0]
+        # 舊介面回傳同樣的決定
+        assert agent.choose_action(hand, tile) == (decision.chi or decision.action)
+    assert {'pass', 'peng', 'chi'} <= seen
+
+
+# --- 新權重的序貫評估 ---
+
+def _start_evaluation(agent, old_wins, old_games=100):
+    agent.pending_evaluation = {
+        'old_weights': dict(agent.weights),
+        'old_stats': {'wins': old_wins, 'losses': old_games - old_wins, 'draws': 0,
+                      'total_games': old_games},
+    }
+    agent.current_session_wins = agent.current_session_games = 0
+
+def _run_evaluation(agent, rng, p):
+    """以勝率 p 逐場打到分出結果或打滿探索間隔，回傳 sequential_test 的結果。"""
+    for games in range(1, agent.exploration_interval + 1):
+        agent.current_session_games = games
+        agent.current_session_wins += rng.random() < p
+        verdict = agent.sequential_test()
+        if verdict is not None:
+            return verdict
+    return None
+
+def test_sequential_test_only_looks_on_schedule(agent):
+    _start_evaluation(agent, 10)
+    agent.current_session_wins = agent.current_session_games = 9
+    assert agent.sequential_test() is None   # 還不到 evaluation_min_games
+    agent.current_session_wins = agent.current_session_games = 15
+    assert agent.sequential_test() is None   # 不是檢查的場次
+    agent.current_session_wins = agent.current_session_games = 20
+    assert agent.sequential_test() is True
+    agent.current_session_wins = 0
+    assert agent.sequential_test() is False
+
+def test_sequential_test_bounds_false_accepts(agent):
+    # 新權重其實剛好只到「舊勝率 + 提升閾值」：每次評估誤接受的機率不能超過 evaluation_alpha
+    rng = random.Random(6)
+    p = 0.40 + agent.improvement_threshold
+    runs = 2000
+    accepted = 0
+    for _ in range(runs):
+        _start_evaluation(agent, 40)
+        accepted += _run_evaluation(agent, rng, p) is True
+    assert accepted / runs <= agent.evaluation_alpha
+
+def test_sequential_test_accepts_clear_improvement(agent):
+    rng = random.Random(7)
+    verdicts = []
+    for _ in range(200):
+        _start_evaluation(agent, 20)
+        verdicts.append(_run_evaluation(agent, rng, 0.8))
+    assert verdicts.count(True) >= 190
+
+@pytest.mark.parametrize("interval", [0, -5])
+def test_evaluation_look_interval_must_be_positive(agent, interval):
+    with pytest.raises(ValueError):
+        agent.evaluation_look_interval = interval
+    assert agent.evaluation_look_interval == 10
+
+def test_update_statistics_finishes_evaluation_early(agent, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)   # 存檔策略可能寫模型檔
+    agent.exploration_rate = 0.0
+    _start_evaluation(agent, 10)
+    for _ in range(agent.evaluation_min_games):
+        agent.update_statistics('player_win')
+    assert not hasattr(agent, 'pending_evaluation')
+    assert agent.evaluation_history == [{'games': 10, 'win_rate': 1.0, 'accepted': True, 'early': True}]
+
+
+# --- 存檔 ---
+
+def test_save_model_round_trip(agent, tmp_path):
+    path = str(tmp_path / "model.bin")
+    agent.wins = 3
+    assert agent.save_model(path)
+    assert not os.path.exists(path + ".tmp")
+    assert read_model(path) == agent.model_state()
+
+def test_failed_write_keeps_previous_model(agent, tmp_path, monkeypatch):
+    path = str(tmp_path / "model.bin")
+    agent.save_model(path)
+    saved = agent.model_state()
+
+    def crash(fd):
+        raise OSError("disk full")
+    monkeypatch.setattr(model_format.os, "fsync", crash)   # 暫存檔寫到一半就失敗
+    agent.wins += 1
+    assert not agent.save_model(path)
+    assert read_model(path) == saved
+
+def test_model_writer_keeps_newest_state(tmp_path):
+    writer = ModelWriter()
+    path = str(tmp_path / "model.bin")
+    for wins in range(50):
+        state = MahjongAgent("player", weights=DEFAULT_WEIGHTS).model_state()
+        state['wins'] = wins
+        writer.submit(path, state)
+    assert writer.flush(timeout=10)
+    assert read_model(path)['wins'] == 49
+
+def test_model_writer_survives_write_errors(tmp_path):
+    writer = ModelWriter()
+    state = MahjongAgent("player", weights=DEFAULT_WEIGHTS).model_state()
+    writer.submit(str(tmp_path / "missing" / "model.bin"), state)
+    assert writer.flush(timeout=10)
+    writer.submit(str(tmp_path / "model.bin"), state)
+    assert writer.flush(timeout=10)
+    assert read_model(str(tmp_path / "model.bin")) == state
+
+def test_checkpoint_after_enough_games(agent, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    agent.exploration_interval = 1000
+    agent.checkpoint_games = 5
+    agent.checkpoint_seconds = 3600
+    agent.model_path = str(tmp_path / "model.bin")
+    for _ in range(4):
+        agent.update_statistics('ai_win')
+    agent_module._model_writer.flush(timeout=10)
+    assert not os.path.exists(agent.model_path)
+    agent.update_statistics('player_win')
+    agent_module._model_writer.flush(timeout=10)
+    assert read_model(agent.model_path)['total_games'] == 5
+    agent.update_statistics('draw')
+    agent.flush()
+    assert read_model(agent.model_path)['total_games'] == 6
+
+
+# --- 每個角色共用一個 agent ---
+
+@pytest.fixture
+def no_agents(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(agent_module, "_agents", {})
+
+def test_get_agent_one_per_role(no_agents, tmp_path):
+    player, ai = get_agent("player"), get_agent("ai")
+    assert get_agent("player") is player and get_agent() is player
+    assert get_agent("ai") is ai and ai is not player
+    assert (player.model_path, ai.model_path) == (MODEL_PATHS["player"], MODEL_PATHS["ai"])
+    assert list(tmp_path.iterdir()) == []   # 建立時不寫檔
+
+def test_ai_falls_back_to_legacy_shared_model(no_agents, tmp_path):
+    state = MahjongAgent("player", weights=DEFAULT_WEIGHTS).model_state()
+    state['wins'] = 42
+    write_model(str(tmp_path / "mahjong_agent.pkl"), state, fmt="pickle")
+    ai = get_agent("ai")
+    assert ai.wins == 42
+    assert ai.save_model()
+    assert read_model(MODEL_PATHS["ai"])['wins'] == 42
+    assert not os.path.exists(MODEL_PATHS["player"])
+    # 之後讀自己的檔，不再讀舊檔
+    ai.wins = 7
+    ai.save_model()
+    assert MahjongAgent("ai").wins == 7
@@ -0,0 +1,49 @@
+"""無介面引擎：給定種子的對局一定會結束、可重現，且牌數守恆。"""
+import random
+
+import pytest
+
+from agent import DEFAULT_WEIGHTS, MahjongAgent
+from mahjong_engine import AgentPolicy, GameState, RandomPolicy, play_game
+
+
+def _total_tiles(state):
+    hands = sum(len(h) for h in state.hands.values())
+    melds = sum(len(m) for ms in state.melds.values() for m in ms)
+    discards = sum(len(d) for d in state.discards.values())
+    # 胡別人打的牌時，那張牌進了手牌，也仍留在棄牌區
+    won_on_discard = state.phase == "over" and state.winner is not None and not state.self_drawn
+    return hands + melds + discards + len(state.deck) - won_on_discard
+
+def _random_game(seed, dealer="player"):
+    rng = random.Random(seed)
+    policies = {"player": RandomPolicy(rng), "ai": RandomPolicy(rng)}
+    return play_game(policies, dealer=dealer, rng=seed)
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_seeded_random_game_ends_with_result(seed):
+    state = _random_game(seed, dealer="ai" if seed % 2 else "player")
+    assert state.phase == "over"
+    assert state.result in ("player_win", "ai_win", "draw")
+    assert state.result == (f"{state.winner}_win" if state.winner else "draw")
+    assert _total_tiles(state) == 64
+
+def test_seeded_game_is_reproducible():
+    a, b = _random_game(7), _random_game(7)
+    assert a.result == b.result
+    assert a.discards == b.discards
+
+def test_agent_game_ends_with_result():
+    agent = MahjongAgent("ai", weights=DEFAULT_WEIGHTS)
+    state = play_game({"player": AgentPolicy(agent), "ai": AgentPolicy(agent)}, rng=3)
+    assert state.result in ("player_win", "ai_win", "draw")
+
+def test_legal_actions_are_accepted_every_step():
+    state = GameState(rng=11)
+    rng = random.Random(11)
+    while state.phase != "over":
+        actions = state.legal_actions()
+        assert actions
+        state.step(rng.choice(actions))
+        assert _total_tiles(state) == 64
@@ -0,0 +1,74 @@
+"""mahjong_log：子系統各自的輸出等級，以及決策 ring buffer。"""
+import logging
+import random
+
+import pytest
+
+import mahjong_log
+from agent import DEFAULT_WEIGHTS, MahjongAgent
+from mahjong_engine import AgentPolicy, RandomPolicy, play_game
+
+
+@pytest.fixture(autouse=True)
+def restore_levels():
+    levels = dict(mahjong_log._console_levels)
+    yield
+    mahjong_log.disable_decision_buffer()
+    for subsystem, level in levels.items():
+        mahjong_log.set_level(subsystem, level)
+
+def _shown(subsystem, level):
+    """這個等級的紀錄會不會輸出到 console。"""
+    logger = mahjong_log.get_logger(subsystem)
+    record = logger.makeRecord(logger.name, level, __file__, 0, "msg", (), None)
+    return logger.isEnabledFor(level) and mahjong_log._ConsoleFilter().filter(record)
+
+
+def test_default_levels():
+    assert _shown("agent", logging.INFO)
+    assert not _shown("decision", logging.DEBUG)
+    assert not _shown("engine", logging.DEBUG)
+
+def test_configure_spec():
+    mahjong_log.configure("decision=DEBUG, agent=warning")
+    assert _shown("decision", logging.DEBUG)
+    assert not _shown("agent", logging.INFO) and _shown("agent", logging.WARNING)
+    mahjong_log.configure("ERROR")
+    assert not any(_shown(s, logging.WARNING) for s in mahjong_log.DEFAULT_LEVELS)
+    with pytest.raises(ValueError):
+        mahjong_log.set_level("agent", "LOUD")
+
+def test_configure_reads_environment(monkeypatch):
+    monkeypatch.setenv("MAHJONG_LOG", "engine=DEBUG")
+    mahjong_log.configure()
+    assert _shown("engine", logging.DEBUG)
+
+def test_decision_buffer_keeps_last_records_without_console_output():
+    log = mahjong_log.get_logger("decision")
+    buffer = mahjong_log.enable_decision_buffer(3)
+    assert log.isEnabledFor(logging.DEBUG) and not _shown("decision", logging.DEBUG)
+    for i in range(5):
+        log.debug("step %d %s", i, "tile")
+    # 存的是還沒組字串的紀錄
+    assert [(r.msg, r.args) for r in buffer.records] == [("step %d %s", (i, "tile")) for i in (2, 3, 4)]
+    assert mahjong_log.recent_decisions() == [f"decision: step {i} tile" for i in (2, 3, 4)]
+    mahjong_log.start_game()
+    assert mahjong_log.recent_decisions() == []
+    assert mahjong_log.recent_decisions(previous=True) == [f"decision: step {i} tile" for i in (2, 3, 4)]
+
+def test_disabling_buffer_restores_levels():
+    mahjong_log.enable_decision_buffer()
+    mahjong_log.disable_decision_buffer()
+    assert not mahjong_log.get_logger("decision").isEnabledFor(logging.DEBUG)
+    assert mahjong_log.recent_decisions() == []
+
+def test_buffer_records_a_game():
+    mahjong_log.enable_decision_buffer(1000)
+    agent = MahjongAgent("player", weights=DEFAULT_WEIGHTS)
+    policies = {"player": AgentPolicy(agent), "ai": RandomPolicy(random.Random(0))}
+    play_game(policies, rng=1)
+    lines = mahjong_log.recent_decisions()
+    assert any(line.startswith("decision: player decides") for line in lines)
+    assert any(line.startswith("engine: ") for line in lines)
+    play_game(policies, rng=2)
+    assert mahjong_log.recent_decisions(previous=True) == lines
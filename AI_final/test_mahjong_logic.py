@@ -0,0 +1,361 @@
+"""mahjong_logic：查表/增量版本的結果要與直接逐張計算的參考版本一致。"""
+import random
+
+import numpy as np
+import pytest
+
+import mahjong_logic
+from mahjong_logic import (
+    Hand, HandState, NUM_TILE_KINDS, ShantenTracker, can_gang, can_hu_with_tile, can_peng,
+    claim_table, create_deck, create_decks, deal_tiles, decode_counts, decode_names,
+    encode_counts, encode_names, encode_tiles, get_chi_options, is_hu, is_hu_batch,
+    key_add, key_count, key_difference, key_is_subset, key_remove, key_size,
+    live_winning_tiles, load_hu_table, save_hu_table, shanten, winning_tiles,
+)
+
+DECK = [t for t in range(NUM_TILE_KINDS) for _ in range(4)]
+
+
+def _can_form_sets(counts, i=0):
+    """遞迴檢查 counts 從編號 i 起能否全部拆成刻子或順子（萬子才有順子）。"""
+    while i < NUM_TILE_KINDS and counts[i] == 0:
+        i += 1
+    if i == NUM_TILE_KINDS:
+        return True
+    if counts[i] >= 3:
+        counts[i] -= 3
+        ok = _can_form_sets(counts, i)
+        counts[i] += 3
+        if ok:
+            return True
+    if i <= 6 and counts[i + 1] and counts[i + 2]:
+        for t in (i, i + 1, i + 2):
+            counts[t] -= 1
+        ok = _can_form_sets(counts, i)
+        for t in (i, i + 1, i + 2):
+            counts[t] += 1
+        return ok
+    return False
+
+def reference_is_hu(counts, meld_count):
+    """不查表的胡牌判定：張數要對，且有某個眼拿掉後剩下的牌全拆成面子。"""
+    counts = list(counts)
+    if sum(counts) != 14 - 3 * meld_count:
+        return False
+    for pair in range(NUM_TILE_KINDS):
+        if counts[pair] >= 2:
+            counts[pair] -= 2
+            ok = _can_form_sets(counts)
+            counts[pair] += 2
+            if ok:
+                return True
+    return False
+
+def _random_counts(rng, size):
+    counts = [0] * NUM_TILE_KINDS
+    for t in rng.sample(DECK, size):
+        counts[t] += 1
+    return counts
+
+def _hands(rng, n=3000):
+    """隨機手牌與從胡牌表抽出的胡牌各半，副露 0-4 組。"""
+    winning = {}
+    for key, sets in load_hu_table().items():
+        winning.setdefault(4 - sets, []).append(key)
+    hands = []
+    for i in range(n):
+        meld_count = rng.randrange(5)
+        if i % 2:
+            counts = decode_counts(rng.choice(winning[meld_count]))
+        else:
+            counts = _random_counts(rng, 14 - 3 * meld_count)
+        hands.append((counts, meld_count))
+    return hands
+
+def _waiting_hands(rng, n):
+    """從胡牌拿掉一張得到的聽牌，與同樣張數的隨機手牌各半：(張數, 副露數)。"""
+    result = []
+    for counts, meld_count in _hands(rng, 2 * n):
+        counts = list(counts)
+        if sum(counts) != 14 - 3 * meld_count:
+            continue
+        counts[rng.choice([t for t in range(NUM_TILE_KINDS) if counts[t]])] -= 1
+        result.append((counts, meld_count))
+    return result[:n]
+
+
+# --- 胡牌表 ---
+
+def test_is_hu_matches_reference():
+    hands = _hands(random.Random(0))
+    assert any(reference_is_hu(c, m) for c, m in hands)
+    for counts, meld_count in hands:
+        assert is_hu(Hand.from_counts(counts), meld_count) == reference_is_hu(counts, meld_count), counts
+
+def test_can_hu_with_tile_matches_reference():
+    rng = random.Random(1)
+    for counts, meld_count in _waiting_hands(rng, 1000):
+        for tile in range(NUM_TILE_KINDS):
+            if counts[tile] < 4:
+                expected = reference_is_hu([c + (t == tile) for t, c in enumerate(counts)], meld_count)
+                assert can_hu_with_tile(Hand.from_counts(counts), meld_count, tile) == expected
+
+
+@pytest.fixture
+def restore_hu_table():
+    yield
+    mahjong_logic.load_hu_table()
+
+def test_hu_table_file_round_trip(tmp_path, restore_hu_table):
+    table = load_hu_table()
+    path = str(tmp_path / "hu_table.bin")
+    save_hu_table(path)
+    assert load_hu_table(path) == table
+
+@pytest.mark.parametrize("corrupt", [
+    lambda data: data[:-8],        # 被截斷
+    lambda data: data[16:],        # 沒有檔頭的舊檔
+    lambda data: data[:4] + (99).to_bytes(4, "little") + data[8:],  # 版本不符
+])
+def test_bad_hu_table_file_is_rebuilt(tmp_path, restore_hu_table, corrupt):
+    table = load_hu_table()
+    path = tmp_path / "hu_table.bin"
+    save_hu_table(str(path))
+    path.write_bytes(corrupt(path.read_bytes()))
+    assert load_hu_table(str(path)) == table
+
+
+# --- 向聽數 ---
+
+def _is_tenpai(counts, meld_count):
+    """再摸任一張（不限張數）就胡：向聽數 0 的定義。"""
+    return any(reference_is_hu([c + (t == tile) for t, c in enumerate(counts)], meld_count)
+               for tile in range(NUM_TILE_KINDS))
+
+def test_shanten_minus_one_is_hu():
+    for counts, meld_count in _hands(random.Random(3), 2000):
+        assert (shanten(Hand.from_counts(counts), meld_count) == -1) == reference_is_hu(counts, meld_count)
+
+def test_shanten_zero_is_tenpai():
+    rng = random.Random(4)
+    hands = _waiting_hands(rng, 500) + [(_random_counts(rng, 13), 0) for _ in range(500)]
+    for counts, meld_count in hands:
+        assert (shanten(Hand.from_counts(counts), meld_count) == 0) == _is_tenpai(counts, meld_count)
+
+def test_shanten_moves_one_step_per_exchange():
+    # 換一張牌向聽數最多差 1；還沒聽牌時一定有一種換法能前進一步
+    rng = random.Random(5)
+    for _ in range(200):
+        counts = _random_counts(rng, 13)
+        value = shanten(Hand.from_counts(counts))
+        best = value
+        for out in [t for t in range(NUM_TILE_KINDS) if counts[t]]:
+            for tile in range(NUM_TILE_KINDS):
+                if tile == out or counts[tile] == 4:
+                    continue
+                after = list(counts)
+                after[out] -= 1
+                after[tile] += 1
+                changed = shanten(Hand.from_counts(after))
+                assert abs(changed - value) <= 1
+                best = min(best, changed)
+        if value > 0:
+            assert best == value - 1
+
+def test_shanten_tracker_follows_draws_and_discards():
+    rng = random.Random(6)
+    for _ in range(50):
+        deck = list(DECK)
+        rng.shuffle(deck)
+        hand = Hand(deck[:13])
+        tracker = ShantenTracker(hand)
+        melds = 0
+        for tile in deck[13:40]:
+            hand.add(tile)
+            assert tracker.draw(tile) == shanten(hand, melds)
+            out = rng.choice(hand.kinds())
+            assert tracker.after_discard(out) == shanten(Hand.from_counts(
+                [c - (t == out) for t, c in enumerate(hand.counts)]), melds)
+            hand.remove(out)
+            assert tracker.discard(out) == shanten(hand, melds)
+            pairs = [t for t in hand.kinds() if hand.count(t) >= 3]
+            if pairs and melds < 3 and rng.random() < 0.2:
+                hand.remove(pairs[0], 3)
+                melds += 1
+                assert tracker.add_meld([pairs[0]] * 3) == shanten(hand, melds)
+        assert tracker.hand == hand
+
+
+# --- 聽牌 ---
+
+def test_winning_tiles_matches_reference():
+    rng = random.Random(7)
+    hands = _waiting_hands(rng, 1000) + [(_random_counts(rng, 13), 0) for _ in range(300)]
+    assert any(winning_tiles(Hand.from_counts(c), m) for c, m in hands)
+    for counts, meld_count in hands:
+        expected = {t for t in range(NUM_TILE_KINDS) if counts[t] < 4
+                    and reference_is_hu([c + (i == t) for i, c in enumerate(counts)], meld_count)}
+        assert winning_tiles(Hand.from_counts(counts), meld_count) == expected
+
+def test_live_winning_tiles_subtracts_visible():
+    hand = Hand([0, 0, 0, 1, 2, 3, 4, 5, 6, 7, 8, 8, 8])  # 九蓮寶燈，聽 1-9 萬
+    visible = [0] * NUM_TILE_KINDS
+    visible[4] = 2
+    visible[1] = 3
+    live = live_winning_tiles(hand, 0, visible)
+    assert set(live) == set(range(9))
+    assert live[0] == 1 and live[4] == 1 and live[1] == 0 and live[2] == 3
+
+
+# --- 壓縮 key ---
+
+def test_packed_key_round_trip():
+    rng = random.Random(8)
+    for _ in range(500):
+        counts = _random_counts(rng, rng.randrange(18))
+        tiles = [t for t, c in enumerate(counts) for _ in range(c)]
+        key = encode_counts(counts)
+        assert decode_counts(key) == counts
+        assert encode_tiles(tiles) == key == Hand(tiles).key
+        assert key_size(key) == len(tiles)
+        assert encode_names(decode_names(key)) == key
+        assert all(key_count(key, t) == counts[t] for t in range(NUM_TILE_KINDS))
+
+def test_packed_key_add_remove():
+    key = encode_tiles([3, 3, 3, 9])
+    assert decode_counts(key_add(key, 3))[3] == 4
+    assert key_remove(key_remove(key, 9), 3, 3) == 0
+    with pytest.raises(ValueError):
+        key_add(key, 3, 2)
+    with pytest.raises(ValueError):
+        key_remove(key, 10)
+
+def test_packed_key_subset_and_difference():
+    rng = random.Random(9)
+    for _ in range(2000):
+        big = _random_counts(rng, rng.randrange(20))
+        small = _random_counts(rng, rng.randrange(8))
+        expected = all(s <= b for s, b in zip(small, big))
+        assert key_is_subset(encode_counts(small), encode_counts(big)) == expected
+        if expected:
+            diff = key_difference(encode_counts(big), encode_counts(small))
+            assert decode_counts(diff) == [b - s for b, s in zip(big, small)]
+        else:
+            with pytest.raises(ValueError):
+                key_difference(encode_counts(big), encode_counts(small))
+
+
+# --- 批次胡牌判定 ---
+
+def test_is_hu_batch_matches_is_hu():
+    hands = _hands(random.Random(2))
+    counts = np.array([c for c, _ in hands])
+    melds = np.array([m for _, m in hands])
+    expected = [is_hu(Hand.from_counts(c), m) for c, m in hands]
+    assert is_hu_batch(counts, melds).tolist() == expected
+    # 單一副露數，以及張數超出範圍的列
+    assert is_hu_batch(counts, 0).tolist() == [is_hu(Hand.from_counts(c), 0) for c, _ in hands]
+    bad = np.zeros((1, NUM_TILE_KINDS), dtype=np.int64)
+    bad[0, 0] = 14
+    assert is_hu_batch(bad, 0).tolist() == [False]
+
+
+# --- 牌山 ---
+
+@pytest.mark.parametrize("rng", [7, random.Random(7), np.random.default_rng(7)])
+def test_create_deck_is_a_seeded_permutation(rng):
+    deck = create_deck(rng)
+    assert sorted(deck) == DECK
+    again = create_deck(7 if isinstance(rng, int) else
+                        random.Random(7) if isinstance(rng, random.Random) else np.random.default_rng(7))
+    assert deck == again
+
+def test_create_decks_rows_are_seeded_permutations():
+    decks = create_decks(50, 3)
+    assert decks.shape == (50, len(DECK))
+    assert all(sorted(row) == DECK for row in decks.tolist())
+    assert np.array_equal(decks, create_decks(50, 3))
+    assert len({tuple(row) for row in decks.tolist()}) == 50
+
+@pytest.mark.parametrize("dealer", ["player", "ai"])
+def test_deal_tiles_matches_popping_the_deck(dealer):
+    row = create_decks(1, 11)[0]
+    player, ai, rest = deal_tiles(row, dealer=dealer)
+    # 逐張 pop()：先發 player 13 張、ai 13 張，莊家再補一張
+    deck = row.tolist()
+    expected = {"player": Hand([deck.pop() for _ in range(13)]),
+                "ai": Hand([deck.pop() for _ in range(13)])}
+    expected[dealer].add(deck.pop())
+    assert (player, ai) == (expected["player"], expected["ai"])
+    assert rest == deck
+    assert deal_tiles(row.tolist(), dealer=dealer)[:2] == (player, ai)
+
+
+# --- 手牌狀態與反應表 ---
+
+def _check_state(state):
+    hand = state.hand
+    for t in range(NUM_TILE_KINDS):
+        assert state.peng[t] == can_peng(hand, t)
+        assert state.gang[t] == can_gang(hand, t)
+        assert state.concealed_gang[t] == can_gang(hand, t, is_self_drawn=True)
+        assert [list(s) for s in state.chi_options(t)] == get_chi_options(hand, t)
+        assert bool(state.present >> t & 1) == (hand.count(t) > 0)
+    assert state.waits == winning_tiles(hand, state.meld_count)
+
+def test_hand_state_tracks_claims_through_a_game():
+    rng = random.Random(12)
+    for _ in range(30):
+        deck = list(DECK)
+        rng.shuffle(deck)
+        wall = iter(deck[13:])
+        state = HandState(Hand(deck[:13]))
+        _check_state(state)
+        for tile in wall:
+            peng = [t for t in range(NUM_TILE_KINDS) if state.peng[t]]
+            chi = [(t, s) for t in range(NUM_TILE_KINDS) for s in state.chi_options(t)]
+            roll = rng.random()
+            if state.meld_count < 4 and peng and roll < 0.1:
+                state.claim_peng(rng.choice(peng))
+            elif state.meld_count < 4 and chi and roll < 0.2:
+                state.claim_chi(*rng.choice(chi))
+            else:
+                state.draw(tile)
+            _check_state(state)
+            gangs = [t for t in range(NUM_TILE_KINDS) if state.concealed_gang[t]]
+            if gangs and state.meld_count < 4:
+                replacement = next(wall, None)  # 槓完補一張
+                if replacement is None:
+                    break
+                state.declare_gang(gangs[0])
+                state.draw(replacement)
+                _check_state(state)
+            state.discard(rng.choice(state.hand.kinds()))
+            _check_state(state)
+            assert len(state.hand) == 13 - 3 * state.meld_count
+
+def test_hand_state_rejects_illegal_claims():
+    state = HandState(Hand([0, 1, 9, 9]))
+    with pytest.raises(ValueError):
+        state.claim_gang(9)
+    with pytest.raises(ValueError):
+        state.claim_chi(5, (4, 5, 6))
+    state.claim_peng(9)
+    assert state.melds == [[9, 9, 9]] and state.hand == Hand([0, 1])
+
+def test_claim_table_matches_single_checks():
+    rng = random.Random(13)
+    hands = _waiting_hands(rng, 300) + [(_random_counts(rng, 13), 0) for _ in range(300)]
+    for counts, meld_count in hands:
+        hand = Hand.from_counts(counts)
+        table = claim_table(hand, meld_count)
+        for tile in range(NUM_TILE_KINDS):
+            expected = []
+            if counts[tile] < 4 and can_hu_with_tile(hand, meld_count, tile):
+                expected.append(("hu",))
+            if can_gang(hand, tile):
+                expected.append(("gang",))
+            if can_peng(hand, tile):
+                expected.append(("peng",))
+            expected += [("chi", tuple(seq)) for seq in get_chi_options(hand, tile)]
+            assert list(table[tile]) == expected
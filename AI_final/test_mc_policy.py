@@ -0,0 +1,115 @@
+"""mc_policy：重抽的牌局只動看不到的牌，模擬可重現，出牌只在靜態排序的前幾張裡挑。"""
+import random
+from collections import Counter
+
+import pytest
+
+from agent import DEFAULT_WEIGHTS, MahjongAgent
+from mahjong_engine import AgentPolicy, GameState, RandomPolicy, other_role, play_game
+from mahjong_logic import NUM_TILE_KINDS
+from mc_policy import MonteCarloPolicy, run_rollouts
+
+
+@pytest.fixture
+def agent():
+    agent = MahjongAgent("player", weights=DEFAULT_WEIGHTS)
+    agent.log_decisions = False
+    return agent
+
+def _mid_game(seed, steps=20):
+    """隨機打幾步後輪到某一方出牌的局面。"""
+    rng = random.Random(seed)
+    state = GameState(rng=seed)
+    policy = RandomPolicy(rng)
+    for _ in range(steps):
+        state.step(policy(state, state.legal_actions()))
+        if state.phase == "over":
+            return _mid_game(seed + 1000, steps)
+    while state.phase != "discard":
+        state.step(policy(state, state.legal_actions()))
+    return state
+
+def _all_tiles(state):
+    tiles = Counter(state.deck)
+    for role in ("player", "ai"):
+        tiles.update(state.hands[role])
+        tiles.update(state.discards[role])
+        tiles.update(t for meld in state.melds[role] for t in meld)
+    return tiles
+
+
+# --- 重抽牌局 ---
+
+def test_determinize_keeps_what_role_can_see():
+    for seed in range(20):
+        state = _mid_game(seed)
+        role = state.current
+        opponent = other_role(role)
+        before = (state.hands[role].copy(), list(state.deck), state.hands[opponent].copy())
+        world = state.determinize(role, random.Random(seed))
+        assert world.hands[role] == state.hands[role] and world.hands[role] is not state.hands[role]
+        assert world.melds == state.melds and world.discards == state.discards
+        assert len(world.hands[opponent]) == len(state.hands[opponent])
+        assert len(world.deck) == len(state.deck)
+        assert _all_tiles(world) == Counter({t: 4 for t in range(NUM_TILE_KINDS)})
+        # 原本的局面不受影響，模擬可以繼續往下走
+        assert (state.hands[role], state.deck, state.hands[opponent]) == before
+        world.step(("discard", next(iter(world.hands[role]))))
+        assert state.hands[role] == before[0]
+
+
+# --- 模擬 ---
+
+def test_run_rollouts_is_reproducible(agent):
+    state = _mid_game(1)
+    candidates = [t for t, _ in agent.rank_discards(state.hands[state.current])][:3]
+    first = run_rollouts(state, candidates, agent, 5, 60.0, 30, 12)
+    assert first == run_rollouts(state, candidates, agent, 5, 60.0, 30, 12)
+    assert set(first) == set(candidates)
+    assert {n for _, n in first.values()} == {10}
+    assert all(-n <= total <= n for total, n in first.values())
+
+def test_run_rollouts_finishes_one_batch_without_time(agent):
+    state = _mid_game(2)
+    candidates = [t for t, _ in agent.rank_discards(state.hands[state.current])][:4]
+    totals = run_rollouts(state, candidates, agent, 0, 0.0, 1000, 4)
+    assert [n for _, n in totals.values()] == [1] * len(candidates)
+
+
+# --- 出牌策略 ---
+
+def test_policy_discards_among_top_candidates(agent):
+    policy = MonteCarloPolicy(agent, time_budget=60.0, max_rollouts=24, horizon=8, top_k=3, seed=0)
+    for seed in range(5):
+        state = _mid_game(seed)
+        action = policy(state, state.legal_actions())
+        top = [t for t, _ in agent.rank_discards(state.hands[state.current])][:3]
+        assert action[0] == "discard" and action[1] in top
+        assert set(policy.last_stats) == set(top)
+        best = max(policy.last_stats.values())[0]
+        assert policy.last_stats[action[1]][0] == best
+
+def test_policy_with_one_candidate_skips_search(agent):
+    policy = MonteCarloPolicy(agent, top_k=1, seed=0)
+    state = _mid_game(3)
+    assert policy(state, state.legal_actions()) == ("discard", agent.decide(state.hands[state.current]).discard)
+    assert policy.last_stats is None
+
+def test_seeded_game_is_reproducible(agent):
+    def play():
+        policies = {"player": MonteCarloPolicy(agent, time_budget=60.0, max_rollouts=8, horizon=6, seed=1),
+                    "ai": AgentPolicy(agent)}
+        state = play_game(policies, rng=4)
+        return state.result, state.discards
+    assert play() == play()
+
+def test_policy_with_worker_processes(agent):
+    policy = MonteCarloPolicy(agent, time_budget=60.0, max_rollouts=16, horizon=6, top_k=2,
+                              workers=2, seed=0)
+    try:
+        state = _mid_game(4)
+        action = policy(state, state.legal_actions())
+        assert action[1] in policy.last_stats
+        assert sum(n for _, n in policy.last_stats.values()) == 16
+    finally:
+        policy.close()
@@ -0,0 +1,63 @@
+"""模型檔：新格式的存讀、舊版 pickle 的安全讀取、壞檔的錯誤。"""
+import os
+import pickle
+
+import pytest
+
+from model_format import (
+    MODEL_FORMAT_VERSION, MODEL_MAGIC, _HEADER, model_file_info, read_model, write_model,
+)
+
+
+def _state():
+    return {
+        'weights': {'pairs': 1.5, 'sequences': 2.25, 'honor': -0.5},
+        'best_weights': {'pairs': 1.0, 'sequences': 2.0, 'honor': 0.0},
+        'wins': 12, 'losses': 7, 'draws': 1,
+        'best_win_rate': 0.6,
+        'evaluation_history': [{'games': 30, 'win_rate': 0.5, 'accepted': False, 'early': True}],
+    }
+
+
+def test_bin_round_trip(tmp_path):
+    path = str(tmp_path / "model.bin")
+    write_model(path, _state())
+    assert model_file_info(path) == ("bin", 1)
+    assert read_model(path) == _state()
+    assert not os.path.exists(path + ".tmp")
+
+def test_legacy_pickle_round_trip(tmp_path):
+    path = str(tmp_path / "model.pkl")
+    write_model(path, _state(), fmt="pickle")
+    assert model_file_info(path) == ("pickle", None)
+    assert read_model(path) == _state()
+
+
+class _Payload:
+    def __reduce__(self):
+        return (os.system, ("echo unsafe",))
+
+def test_legacy_pickle_with_objects_is_rejected(tmp_path):
+    path = tmp_path / "model.pkl"
+    path.write_bytes(pickle.dumps({'weights': _Payload(), 'best_weights': {}}))
+    with pytest.raises(ValueError):
+        read_model(str(path))
+
+@pytest.mark.parametrize("corrupt", [
+    lambda data: data[:-1],                  # 被截斷
+    lambda data: data[:10],                  # 連檔頭都不完整
+    lambda data: data[:4] + (99).to_bytes(4, "little") + data[8:],  # 版本太新
+])
+def test_bad_bin_file_raises(tmp_path, corrupt):
+    path = tmp_path / "model.bin"
+    write_model(str(path), _state())
+    path.write_bytes(corrupt(path.read_bytes()))
+    with pytest.raises(ValueError):
+        read_model(str(path))
+
+@pytest.mark.parametrize("meta", [b"[]", b"42", b'"text"', b"null"])
+def test_bin_file_with_non_object_metadata_raises(tmp_path, meta):
+    path = tmp_path / "model.bin"
+    path.write_bytes(_HEADER.pack(MODEL_MAGIC, MODEL_FORMAT_VERSION, len(meta), 0) + meta)
+    with pytest.raises(ValueError):
+        read_model(str(path))
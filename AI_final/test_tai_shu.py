@@ -0,0 +1,180 @@
+"""tai_shu：拆牌要與胡牌判定一致，常見牌型的台數要算對。"""
+import random
+
+import pytest
+
+import tai_shu
+from mahjong_logic import Hand, NUM_TILE_KINDS, decode_counts, get_hu_table, is_hu
+from tai_shu import (
+    best_decomposition, decompose, decomposition_cache_info, recognize_hu, score_hand, set_tiles,
+)
+
+NAMES = [name for name, _ in sorted(tai_shu.tile_order.items(), key=lambda kv: kv[1])]
+DECK = [t for t in range(NUM_TILE_KINDS) for _ in range(4)]
+
+
+def _counts(tiles):
+    counts = [0] * NUM_TILE_KINDS
+    for t in tiles:
+        counts[t] += 1
+    return counts
+
+def _concealed_hands(rng, n):
+    """門清 14 張：從胡牌表抽出的胡牌與隨機手牌各半。"""
+    winning = [key for key, sets in get_hu_table().items() if sets == 4]
+    return [decode_counts(rng.choice(winning)) if i % 2 else _counts(rng.sample(DECK, 14))
+            for i in range(n)]
+
+
+# --- 拆牌 ---
+
+def test_decompose_agrees_with_is_hu():
+    for counts in _concealed_hands(random.Random(0), 2000):
+        found = decompose(counts)
+        seven_pairs = sum(1 for c in counts if c == 2) == 7
+        assert bool(found) == (is_hu(Hand.from_counts(counts)) or seven_pairs), counts
+        for d in found:
+            tiles = [t for s in d.concealed_sets for t in set_tiles(s)]
+            if d.is_seven_pairs:
+                tiles += [t for t in d.pairs for _ in range(2)]
+            else:
+                tiles += [d.pair, d.pair]
+            assert _counts(tiles) == counts
+
+def test_decompose_lists_every_split():
+    # 111 222 333 可以是三刻也可以是三順
+    counts = _counts([0, 0, 0, 1, 1, 1, 2, 2, 2, 9, 9, 9, 15, 15])
+    splits = {tuple(sorted(d.concealed_sets)) for d in decompose(counts)}
+    assert (("chi", 0), ("chi", 0), ("chi", 0), ("peng", 9)) in splits
+    assert (("peng", 0), ("peng", 1), ("peng", 2), ("peng", 9)) in splits
+
+def test_decomposition_is_cached_on_the_hand():
+    counts = _counts([0, 1, 2, 3, 4, 5, 6, 7, 8, 0, 1, 2, 9, 9])
+    decompose(counts)
+    hits = decomposition_cache_info()[0]
+    decompose(counts, [("peng", 10)])
+    assert decomposition_cache_info()[0] == hits + 1
+
+
+# --- 牌型與台數 ---
+
+@pytest.mark.parametrize("exposed, concealed, yaku, tai", [
+    ([], [0, 1, 2, 3, 4, 5, 6, 7, 8, 0, 1, 2, 9, 9], ["pi hu"], 10),
+    ([], [0, 0, 0, 1, 2, 3, 4, 5, 6, 7, 8, 8, 8, 4], ["九聯保燈", "clear_one_color"], 168),
+    ([], [13, 13, 13, 14, 14, 14, 15, 15, 15, 0, 1, 2, 3, 3], ["big_three_happy", "three_dark"], 128),
+    ([], [9, 9, 9, 10, 10, 10, 11, 11, 11, 12, 12, 0, 0, 0], ["small_four_happy", "four_dark"], 264),
+    ([], [9, 9, 10, 10, 11, 11, 12, 12, 13, 13, 14, 14, 15, 15], ["weird_seven"], 88),
+    # 連續七對也能拆成順子，清一色加平胡比連七高
+    ([], [0, 0, 1, 1, 2, 2, 3, 3, 4, 4, 5, 5, 6, 6], ["clear_one_color"], 90),
+    ([9] * 4 + [10] * 4 + [11] * 4 + [12] * 4, [3, 3], ["four_gong", "big_four_happy"], 216),
+    ([9, 9, 9], [3, 4], [], 0),
+])
+def test_known_hands(exposed, concealed, yaku, tai):
+    s1 = ";".join(NAMES[t] for t in exposed)
+    s2 = ",".join(NAMES[t] for t in concealed)
+    assert recognize_hu(s1, s2, 0, 50) == (yaku, tai)
+
+
+# --- score_hand ---
+
+def _winning_hands_with_melds(rng, n):
+    """胡牌表抽出的手牌加上隨機副露（碰或吃），每種牌總數不超過 4 張。"""
+    winning = {}
+    for key, sets in get_hu_table().items():
+        winning.setdefault(4 - sets, []).append(key)
+    result = []
+    while len(result) < n:
+        meld_count = rng.randrange(5)
+        counts = decode_counts(rng.choice(winning[meld_count]))
+        melds = []
+        for _ in range(meld_count):
+            t = rng.randrange(NUM_TILE_KINDS)
+            melds.append([t] * 3 if t > 6 or rng.random() < 0.5 else [t, t + 1, t + 2])
+        total = counts[:]
+        for t in (t for meld in melds for t in meld):
+            total[t] += 1
+        if max(total) <= 4:
+            result.append((counts, melds))
+    return result
+
+def test_score_hand_matches_recognize_hu():
+    rng = random.Random(1)
+    for counts, melds in _winning_hands_with_melds(rng, 1000):
+        is_self, wall = rng.random() < 0.5, rng.choice([0, 20, 36, 50])
+        scored = score_hand(counts, melds, is_self, wall)
+        assert scored.is_win
+        s1 = ";".join(NAMES[t] for meld in melds for t in meld)
+        s2 = ",".join(NAMES[t] for t, c in enumerate(counts) for _ in range(c))
+        yaku, tai = recognize_hu(s1, s2, is_self, wall)
+        # 字串沒有分組，會試副露的每種拆法，台數不會比照實際副露算的低
+        assert tai >= scored.tai
+        if not melds:
+            assert (yaku, tai) == tuple(scored)
+
+def test_score_hand_accepts_hand_and_counts():
+    rng = random.Random(2)
+    for counts in _concealed_hands(rng, 300):
+        expected = score_hand(counts)
+        assert tuple(score_hand(Hand.from_counts(counts))) == tuple(expected)
+        assert expected.is_win == (is_hu(Hand.from_counts(counts))
+                                   or sum(1 for c in counts if c == 2) == 7)
+
+def test_score_hand_keeps_exposed_chows_apart():
+    # 吃了 123、234、345 萬；字串介面可能把它們當成刻子
+    melds = [[0, 1, 2], [1, 2, 3], [2, 3, 4]]
+    scored = score_hand(_counts([9, 9, 9, 15, 15]), melds)
+    assert [kind for kind, _ in scored.decomposition.exposed_sets] == ["chi"] * 3
+    assert scored.tai == 0 and scored.yaku == ["pi hu"]
+
+def test_score_hand_situational_bonus():
+    counts = _counts([0, 1, 2, 3, 4, 5, 6, 7, 8, 0, 1, 2, 9, 9])
+    base = score_hand(counts)
+    assert base.bonus == 0
+    for is_self, wall, bonus in [(True, None, 1), (False, 36, 160), (True, 0, 21)]:
+        scored = score_hand(counts, (), is_self, wall)
+        assert scored.bonus == bonus and scored.tai == base.tai + bonus
+        assert scored.yaku == base.yaku
+
+def test_score_hand_not_a_win():
+    scored = score_hand(_counts([0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13]))
+    assert not scored.is_win and tuple(scored) == ([], 0)
+
+
+# --- 門清計分表 ---
+
+@pytest.fixture(scope="module")
+def score_table_path(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("score") / "score_table.bin")
+    tai_shu.build_score_table(path)
+    yield path
+    tai_shu._score_table = None
+
+def test_score_table_matches_decomposition(score_table_path):
+    keys, masks, tais = tai_shu.load_score_table(score_table_path)
+    assert (keys[1:] > keys[:-1]).all()
+    assert {key for key, sets in get_hu_table().items() if sets == 4} <= set(keys.tolist())
+    rng = random.Random(3)
+    for i in rng.sample(range(len(keys)), 2000):
+        d, mask, tai = best_decomposition(decode_counts(int(keys[i])))
+        assert (int(masks[i]), int(tais[i])) == (mask, tai)
+
+def test_score_hand_same_with_and_without_table(score_table_path, monkeypatch):
+    hands = _concealed_hands(random.Random(4), 1000)
+    tai_shu.load_score_table(score_table_path)
+    with_table = [tuple(score_hand(c, (), True, 0)) for c in hands]
+    monkeypatch.setattr(tai_shu, "_score_table", False)
+    assert with_table == [tuple(score_hand(c, (), True, 0)) for c in hands]
+
+@pytest.mark.parametrize("corrupt", [
+    lambda data: data[:-2],                                         # 被截斷
+    lambda data: b"XXXX" + data[4:],                                # 不是計分表
+    lambda data: data[:4] + (99).to_bytes(4, "little") + data[8:],  # 版本不符
+])
+def test_bad_score_table_falls_back(score_table_path, tmp_path, corrupt):
+    path = tmp_path / "score_table.bin"
+    with open(score_table_path, "rb") as f:
+        path.write_bytes(corrupt(f.read()))
+    assert tai_shu.load_score_table(str(path)) is None
+    assert tai_shu._lookup_score(0) is False
+    counts = _counts([0, 1, 2, 3, 4, 5, 6, 7, 8, 0, 1, 2, 9, 9])
+    assert tuple(score_hand(counts)) == (["pi hu"], 10)
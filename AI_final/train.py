@@ -0,0 +1,147 @@
+"""
+離線調整 MahjongAgent 權重：交叉熵法 (cross-entropy method) 的族群搜尋。
+每一代從常態分布抽出一群權重，各自以無介面對局 (mahjong_engine.play_game)
+對一般 AI (RandomPolicy) 打同一批牌山，用 process pool 分散到所有核心；
+勝率最高的一群決定下一代的平均與標準差。
+結束後把最佳權重寫回 player 的模型檔（load_model 讀得到的格式）。
+用法：python train.py [-g 代數] [-p 族群大小] [-n 每組權重場數] [-j 行程數]
+"""
+import argparse
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from agent import MahjongAgent, FEATURE_NAMES, DEFAULT_WEIGHTS
+from mahjong_engine import AgentPolicy, RandomPolicy, play_game
+from mahjong_logic import HU_TABLE_PATH, create_decks, load_hu_table, save_hu_table
+import mahjong_log
+
+CHUNK_GAMES = 25  # 每個工作單位打幾場
+
+_agent = None  # 每個 worker 行程共用一個 agent，換權重即可
+
+def _init_worker(hu_table_path, weights):
+    """
+    worker 啟動時讀主行程準備好的胡牌表檔（不在每個 worker 重新建表），
+    並建立不讀寫模型檔、不寫 decision log 的 agent。
+    """
+    global _agent
+    # worker 只輸出警告以上的訊息
+    mahjong_log.set_level("agent", "WARNING")
+    load_hu_table(hu_table_path)
+    _agent = MahjongAgent("player", weights=weights)
+    _agent.log_decisions = False
+
+def _play_games(weights, decks, dealers, seeds):
+    """用 weights 當 player 打完一批牌山，回傳 (勝, 負, 和)。"""
+    _agent.weights = dict(zip(FEATURE_NAMES, weights))
+    wins = losses = 0
+    for deck, dealer, seed in zip(decks, dealers, seeds):
+        policies = {"player": AgentPolicy(_agent), "ai": RandomPolicy(random.Random(seed))}
+        result = play_game(policies, deck=deck.tolist(), dealer=dealer).result
+        wins += result == "player_win"
+        losses += result == "ai_win"
+    return wins, losses, len(decks) - wins - losses
+
+def _make_games(n, rng):
+    """n 局共用的牌山、莊家與一般 AI 的亂數種子（同一代的每組權重都打這些局）。"""
+    decks = create_decks(n, rng)
+    dealers = ["player" if i % 2 == 0 else "ai" for i in range(n)]
+    seeds = rng.integers(1 << 31, size=n).tolist()
+    return decks, dealers, seeds
+
+def evaluate_population(pool, population, games):
+    """回傳每組權重的勝率（勝場 / 總場數）。"""
+    decks, dealers, seeds = games
+    jobs = []
+    for i, weights in enumerate(population):
+        for start in range(0, len(decks), CHUNK_GAMES):
+            end = start + CHUNK_GAMES
+            jobs.append((i, pool.submit(_play_games, weights.tolist(), decks[start:end],
+                                        dealers[start:end], seeds[start:end])))
+    wins = np.zeros(len(population))
+    for i, job in jobs:
+        wins[i] += job.result()[0]
+    return wins / len(decks)
+
+def train(start_weights, generations=20, population=32, games=100, elite=0.25,
+          sigma=0.3, workers=None, seed=None):
+    """
+    交叉熵法搜尋權重，回傳 (最佳權重 dict, 驗證勝率)。
+    start_weights：初始平均；sigma：初始標準差（相對於權重大小，至少 sigma）。
+    每代的第 0 組固定是目前的平均，最後用一批新牌山在平均與歷代最佳之間挑一組。
+    """
+    rng = np.random.default_rng(seed)
+    mean = np.array([start_weights[name] for name in FEATURE_NAMES], dtype=float)
+    std = sigma * np.maximum(np.abs(mean), 1.0)
+    min_std = 0.05 * std
+    n_elite = max(2, int(population * elite))
+    best_weights, best_rate = mean.copy(), -1.0
+
+    if not os.path.exists(HU_TABLE_PATH):
+        save_hu_table(HU_TABLE_PATH)  # 建一次表寫成檔，worker 啟動時直接讀
+    init_weights = dict(zip(FEATURE_NAMES, mean.tolist()))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(HU_TABLE_PATH, init_weights)) as pool:
+        for generation in range(1, generations + 1):
+            start = time.perf_counter()
+            candidates = mean + std * rng.standard_normal((population, len(mean)))
+            candidates[0] = mean
+            rates = evaluate_population(pool, candidates, _make_games(games, rng))
+
+            order = np.argsort(-rates, kind="stable")
+            elites = candidates[order[:n_elite]]
+            mean = elites.mean(axis=0)
+            std = np.maximum(elites.std(axis=0), min_std)
+            if rates[order[0]] > best_rate:
+                best_rate = rates[order[0]]
+                best_weights = candidates[order[0]].copy()
+            print(f"第 {generation} 代：最佳 {rates[order[0]]:.2%}，平均 {rates.mean():.2%}，"
+                  f"前段平均 {rates[order[:n_elite]].mean():.2%}，{time.perf_counter() - start:.1f}s")
+
+        # 族群裡的最佳值帶有選擇偏差，用沒看過的牌山重新比一次
+        final = np.array([mean, best_weights])
+        rates = evaluate_population(pool, final, _make_games(games * 4, rng))
+    pick = int(np.argmax(rates))
+    print(f"驗證：最後平均 {rates[0]:.2%}，歷代最佳 {rates[1]:.2%}")
+    return dict(zip(FEATURE_NAMES, final[pick].tolist())), float(rates[pick])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-g", "--generations", type=int, default=20)
+    parser.add_argument("-p", "--population", type=int, default=32)
+    parser.add_argument("-n", "--games", type=int, default=100, help="每組權重每代打幾場")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="行程數，預設為 CPU 核心數")
+    parser.add_argument("--elite", type=float, default=0.25, help="保留前多少比例更新分布")
+    parser.add_argument("--sigma", type=float, default=0.3)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--model", default=None,
+                        help="讀取初始權重並寫回的模型檔，預設為 player 的模型檔（見 agent.MODEL_PATHS）")
+    parser.add_argument("--fresh", action="store_true", help="從預設權重開始，不讀模型檔")
+    args = parser.parse_args()
+
+    agent = MahjongAgent("player", weights=DEFAULT_WEIGHTS, model_path=args.model)
+    if not args.fresh and agent.load_model():
+        print("從模型檔的權重開始")
+
+    start = time.perf_counter()
+    weights, rate = train(agent.weights, args.generations, args.population, args.games,
+                          args.elite, args.sigma, args.workers, args.seed)
+
+    # 保留原本的累計戰績，換上新權重並重新開始探索的回合統計
+    agent.weights = weights
+    agent.best_weights = dict(weights)
+    agent.best_win_rate = rate
+    agent.has_baseline = True
+    agent.games_since_last_exploration = 0
+    agent.current_session_wins = agent.current_session_losses = 0
+    agent.current_session_draws = agent.current_session_games = 0
+    if agent.save_model():
+        print(f"已寫入 {agent.model_path}（勝率 {rate:.2%}，共 {time.perf_counter() - start:.1f}s）")
+
+if __name__ == "__main__":
+    main()